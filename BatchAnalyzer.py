@@ -0,0 +1,337 @@
+#!/usr/bin/env python
+"""
+Headless batch analysis of recorded videos
+Analyzes every video of a directory or glob with a pool of worker processes,
+without drawing or encoding, and writes per video a per-frame metrics CSV
+and an events summary with the fatigue metrics of every tracked face.
+Videos that already have a summary are skipped, so an interrupted batch
+resumes where it stopped. With --frame-workers the videos are analyzed one
+after another instead, each spread over that many processes through a
+SharedMemoryPipeline
+
+Usage:
+    python BatchAnalyzer.py recordings/ "more/*.mp4" --output results/
+"""
+import argparse
+import csv
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import cv2
+import ModelRegistry
+from FrameAnalyzer import FrameAnalyzer
+from LandmarkCache import open_cache
+from SharedMemoryPipeline import SharedMemoryPipeline
+from FaceDetectors import detector_spec
+
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.wmv')
+
+METRICS_COLUMNS = ['frame', 'time_s', 'faces', 'ear', 'mar', 'head_tilt',
+                   'eyes_closed', 'yawning', 'perclos', 'blinks_per_min', 'yawns_per_min']
+
+
+def find_videos(inputs):
+    """Video files in the given directories, globs or file paths, sorted"""
+    videos = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                for name in files:
+                    if name.lower().endswith(VIDEO_EXTENSIONS):
+                        videos.add(os.path.join(root, name))
+        else:
+            for path in glob.glob(item, recursive=True):
+                if os.path.isfile(path) and path.lower().endswith(VIDEO_EXTENSIONS):
+                    videos.add(path)
+    return sorted(videos)
+
+
+def output_names(videos):
+    """Output file stem per video, made unique when two videos share a name"""
+    stems = {}
+    for path in videos:
+        stems.setdefault(os.path.splitext(os.path.basename(path))[0], []).append(path)
+    names = {}
+    for stem, paths in stems.items():
+        for path in paths:
+            if len(paths) == 1:
+                names[path] = stem
+            else:
+                digest = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:8]
+                names[path] = f"{stem}_{digest}"
+    return names
+
+
+def _episodes(flags, fps):
+    """Runs of consecutive True frames as dicts with frame and time bounds"""
+    episodes = []
+    start = None
+    for index, flag in enumerate(flags + [False]):
+        if flag and start is None:
+            start = index
+        elif not flag and start is not None:
+            episodes.append({
+                'start_frame': start,
+                'end_frame': index - 1,
+                'start_s': round(start / fps, 3),
+                'duration_s': round((index - start) / fps, 3),
+            })
+            start = None
+    return episodes
+
+
+def _init_worker():
+    # One predictor per worker process, and no OpenCV threads competing
+    # with the other workers for the same cores
+    cv2.setNumThreads(1)
+    ModelRegistry.get_predictor()
+
+
+def _read_frames(vs):
+    """(frame, None) of every frame of vs, no cached faces"""
+    while True:
+        ret, frame = vs.read()
+        if not ret:
+            return
+        yield frame, None
+
+
+def _cached_results(analyzer, cache):
+    """FrameResult of every frame of a complete cache, without decoding the video
+
+    The EAR and MAR come from LandmarkCache.iter_metrics, one vectorized
+    pass per block of frames.
+    """
+    for start, counts, ears, mars in cache.iter_metrics():
+        for offset, count in enumerate(counts):
+            (rects, shapes) = cache.read(start + offset)
+            yield analyzer.analyze_cached(rects, shapes, ears[offset, :count], mars[offset, :count])
+
+
+def analyze_video(video_path, metrics_path, events_path, analyzer_options, write_cache,
+                  frame_workers=0):
+    """Analyze one video, returns its events summary
+
+    With frame_workers, faces and landmarks come from a SharedMemoryPipeline
+    of that many processes, which scans the whole frame on every frame.
+    """
+    start_time = time.perf_counter()
+    vs = cv2.VideoCapture(video_path)
+    fps = vs.get(cv2.CAP_PROP_FPS) or 30
+    total_frames = int(vs.get(cv2.CAP_PROP_FRAME_COUNT))
+
+    if frame_workers:
+        analyzer_options = dict(analyzer_options, detect_interval=1, roi_margin=None)
+    analyzer = FrameAnalyzer(**analyzer_options, fatigue_fps=fps)
+
+    cache = open_cache(video_path, analyzer.cache_settings())
+    use_cache = cache is not None and cache.complete
+    if cache is not None and not use_cache:
+        if write_cache and total_frames > 0:
+            cache.create(total_frames)
+        else:
+            cache = None
+
+    eyes_closed = []
+    yawning = []
+    face_frames = 0
+    # FatigueMetrics of the tracks in view; a track that is gone only keeps
+    # its final snapshot, so long videos do not pile up ring buffers
+    fatigue = {}
+    finished = {}
+    pipeline = None
+    if use_cache:
+        # Everything is in the cache, the video is not even decoded
+        results = _cached_results(analyzer, cache)
+    else:
+        if frame_workers:
+            vs.release()
+            pipeline = SharedMemoryPipeline(video_path, frame_workers, analyzer.frame_size,
+                                            detect_scale=analyzer.detect_scale,
+                                            upsample=analyzer.upsample,
+                                            detector_backend=analyzer.detector_backend)
+            frames = ((frame, cached) for _, frame, cached in pipeline)
+        else:
+            frames = _read_frames(vs)
+        results = (analyzer.analyze(frame, cached) for frame, cached in frames)
+    tmp_path = metrics_path + '.tmp'
+    with open(tmp_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(METRICS_COLUMNS)
+        index = 0
+        for result in results:
+            faces = result.faces if result is not None else []
+            if cache is not None and not use_cache:
+                cache.write(index, faces)
+
+            if faces:
+                face = faces[0]
+                face_frames += 1
+                metrics = face.metrics
+                writer.writerow([index, f"{index / fps:.3f}", len(faces), f"{face.ear:.4f}",
+                                 f"{face.mar:.4f}", f"{face.head_tilt:.2f}",
+                                 int(face.eyes_closed), int(face.yawning),
+                                 f"{metrics.perclos:.4f}", f"{metrics.blinks_per_min:.2f}",
+                                 f"{metrics.yawns_per_min:.2f}"])
+            else:
+                writer.writerow([index, f"{index / fps:.3f}", 0, '', '', '', 0, 0, '', '', ''])
+
+            alive = {track.id: track.metrics for track in analyzer.tracks.tracks}
+            for track_id in fatigue.keys() - alive.keys():
+                finished[track_id] = fatigue[track_id].snapshot()
+            fatigue = alive
+            eyes_closed.append(bool(faces) and faces[0].eyes_closed)
+            yawning.append(bool(faces) and faces[0].yawning)
+            index += 1
+    if pipeline is not None:
+        pipeline.close()
+    vs.release()
+    os.replace(tmp_path, metrics_path)
+    if cache is not None and not use_cache:
+        cache.finish(index)
+
+    seconds = time.perf_counter() - start_time
+    summary = {
+        'video': video_path,
+        'frames': index,
+        'video_fps': fps,
+        'duration_s': round(index / fps, 3),
+        'frames_with_face': face_frames,
+        'eyes_closed_episodes': _episodes(eyes_closed, fps),
+        'yawn_episodes': _episodes(yawning, fps),
+        'fatigue': {str(track_id): snapshot for track_id, snapshot in sorted(
+            {**finished, **{i: m.snapshot() for i, m in fatigue.items()}}.items())},
+        'analysis_seconds': round(seconds, 3),
+        'analysis_fps': round(index / seconds, 2) if seconds else 0.0,
+        'from_cache': use_cache,
+    }
+    tracker = analyzer.tracker
+    if tracker.roi_margin is not None and tracker.roi_attempts:
+        # Tells how well the search window margin works on these videos
+        summary['roi'] = {
+            'margin': tracker.roi_margin,
+            'hit_rate': round(tracker.roi_hit_rate, 4),
+            'detection_rate': round(tracker.detection_rate, 4),
+            'mean_detect_ms': round(tracker.mean_detect_ms, 2),
+        }
+
+    # The summary is written last and atomically, its presence marks the
+    # video as done when resuming
+    tmp_path = events_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(summary, f, indent=2)
+    os.replace(tmp_path, events_path)
+    return summary
+
+
+def _run_jobs(jobs, analyzer_options, write_cache, workers, frame_workers):
+    """(video path, summary, error) of every job as it finishes
+
+    Videos run in parallel in a pool of workers processes, or with
+    frame_workers one after another in this process, each over its own
+    SharedMemoryPipeline.
+    """
+    if frame_workers:
+        for path, metrics_path, events_path in jobs:
+            try:
+                yield path, analyze_video(path, metrics_path, events_path, analyzer_options,
+                                          write_cache, frame_workers), None
+            except Exception as e:
+                yield path, None, e
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        futures = {pool.submit(analyze_video, path, metrics_path, events_path,
+                               analyzer_options, write_cache): path
+                   for path, metrics_path, events_path in jobs}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result(), None
+            except Exception as e:
+                yield futures[future], None, e
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless batch drowsiness analysis of recorded videos")
+    parser.add_argument('inputs', nargs='+', help='video files, directories or glob patterns')
+    parser.add_argument('-o', '--output', default='batch_results', help='output directory')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--detect-interval', type=int, default=1,
+                        help='run the full face detector every N frames, track in between')
+    parser.add_argument('--detect-scale', type=float, default=1.0,
+                        help='detect faces on the frame shrunk by this factor (at least 1)')
+    parser.add_argument('--roi-margin', type=float, default=None,
+                        help='search for faces around the last face first, grown by this '
+                             'many face sizes on every side')
+    parser.add_argument('--roi-fallback', type=int, default=3,
+                        help='failed searches around the last face before scanning the whole frame')
+    parser.add_argument('--frame-workers', type=int, default=0,
+                        help='analyze one video at a time, each over N processes')
+    parser.add_argument('--detector', default=None,
+                        help='face detector: hog, haar[:cascade] or a model file '
+                             '(default: $DROWSINESS_DETECTOR or hog)')
+    parser.add_argument('--write-cache', action='store_true',
+                        help='store the landmarks in the landmark cache for later runs')
+    parser.add_argument('--force', action='store_true', help='analyze videos that already have results')
+    args = parser.parse_args()
+    if args.detect_scale < 1.0:
+        parser.error("--detect-scale must be at least 1")
+
+    videos = find_videos(args.inputs)
+    if not videos:
+        sys.exit("No videos found")
+    os.makedirs(args.output, exist_ok=True)
+
+    names = output_names(videos)
+    jobs = []
+    for path in videos:
+        metrics_path = os.path.join(args.output, names[path] + '.metrics.csv')
+        events_path = os.path.join(args.output, names[path] + '.events.json')
+        if os.path.exists(events_path) and not args.force:
+            continue
+        jobs.append((path, metrics_path, events_path))
+
+    workers = f"{args.frame_workers} frame workers" if args.frame_workers else f"{args.workers} workers"
+    print(f"[INFO] {len(videos)} videos found, {len(videos) - len(jobs)} already done, "
+          f"{len(jobs)} to analyze with {workers}")
+    if not jobs:
+        return
+
+    analyzer_options = {'detect_interval': args.detect_interval,
+                        'detect_scale': args.detect_scale,
+                        'roi_margin': args.roi_margin,
+                        'roi_fallback': args.roi_fallback,
+                        'detector_backend': detector_spec(args.detector)}
+    start_time = time.perf_counter()
+    total_frames = 0
+    failed = 0
+    for done, (path, summary, error) in enumerate(
+            _run_jobs(jobs, analyzer_options, args.write_cache, args.workers, args.frame_workers), 1):
+        if error is not None:
+            failed += 1
+            print(f"[ERROR] {path}: {error}")
+            continue
+        total_frames += summary['frames']
+        elapsed = time.perf_counter() - start_time
+        print(f"[INFO] ({done}/{len(jobs)}) {os.path.basename(path)}: {summary['frames']} frames, "
+              f"{len(summary['eyes_closed_episodes'])} eyes closed, "
+              f"{len(summary['yawn_episodes'])} yawns, {summary['analysis_fps']:.1f} fps"
+              + (f", ROI hits {summary['roi']['hit_rate'] * 100:.0f}% "
+                 f"({summary['roi']['mean_detect_ms']:.0f} ms/detection)" if 'roi' in summary else "")
+              + f" | total {total_frames / elapsed:.1f} fps")
+
+    elapsed = time.perf_counter() - start_time
+    print(f"[INFO] Done: {len(jobs) - failed} videos, {total_frames} frames in {elapsed:.1f}s "
+          f"({total_frames / elapsed:.1f} fps, {(len(jobs) - failed) / elapsed * 3600:.0f} videos/hour)")
+    if failed:
+        print(f"[WARNING] {failed} videos failed, run again to retry them")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
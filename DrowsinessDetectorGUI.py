@@ -3,6 +3,9 @@
 GUI for Driver Drowsiness Detection
 Allows user to select camera or upload video file for analysis
 """
+import time
+STARTUP_START = time.perf_counter()
+
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import cv2
@@ -10,19 +13,52 @@ import threading
 import os
 import sys
 
-# Import detection modules
-from scipy.spatial import distance as dist
-from imutils.video import VideoStream
-from imutils import face_utils
-import imutils
-import time
-import dlib
-import math
-import numpy as np
+# Import the light modules. The analysis ones (dlib, imutils and the
+# modules built on them) are imported where they are first used, in the
+# background threads, so the window shows up without waiting for them
 from PIL import Image, ImageTk
-from EAR import eye_aspect_ratio
-from MAR import mouth_aspect_ratio
-from HeadPose import getHeadTiltAndCoords
+from FramePipeline import CaptureStage, FrameQueue
+from QualityController import QualityController
+from VideoEncoder import VideoEncoder
+from Profiler import Profiler
+
+IMPORT_SECONDS = time.perf_counter() - STARTUP_START
+
+
+# Capture queue sizes in frames. The camera queue drops the oldest frame
+# when full so the analysis never lags behind, the video file queue waits
+# instead. The display only ever keeps the newest analyzed frame
+CAMERA_QUEUE_SIZE = 2
+VIDEO_CAPTURE_QUEUE_SIZE = 8
+
+# Processes predicting the landmarks of frames with several faces, live
+# only. 1 keeps prediction inline: each pooled face costs a crop round trip
+# of about a millisecond, as much as predicting it. Raise it where
+# benchmarks/landmark_pool.py shows a speedup
+LANDMARK_WORKERS = 1
+
+# Overlay.OVERLAY_LEVELS, in menu order. Listed here so that building the
+# menu does not import the analysis modules
+OVERLAY_LEVELS = ('none', 'alerts', 'hulls', 'debug')
+
+# Failed searches around the last face before the whole frame is scanned
+# again, when the face search margin is set
+ROI_FALLBACK = 3
+
+# Interval of the display stage polling, in milliseconds
+DISPLAY_POLL_MS = 5
+
+# Largest size of the displayed video, frames are scaled to fit
+DISPLAY_SIZE = (700, 525)
+
+# Stage timings are written here when the window is closed with profiling on
+PROFILE_PATH = 'profile_timings.json'
+
+# Export encoder, see VideoEncoder.BACKENDS; 'auto' uses ffmpeg when installed
+ENCODER_BACKEND = 'auto'
+
+# Refresh interval of the stage timings panel, in milliseconds
+PROFILE_REFRESH_MS = 500
 
 
 # Language translations
@@ -62,10 +98,29 @@ LANGUAGES = {
         'export_title': 'Export Video',
         'export_success': 'Video exported successfully!',
         'export_error': 'Error exporting video',
+        'parallel_export': 'Parallel export',
+        # Detection settings
+        'detect_interval': 'Detect every N frames:',
+        'roi_margin': 'Face search margin (0 = off):',
         # Menu
         'language': 'Language',
         'english': 'English',
         'spanish': 'Spanish',
+        # Profiling
+        'profiling': 'Profiling',
+        'profile_enable': 'Time pipeline stages',
+        'profile_panel': 'Stage timings',
+        'profile_save': 'Save timings (JSON)...',
+        'profile_empty': 'No timings yet, enable profiling and start detection',
+        'overlay': 'Overlay',
+        'overlay_none': 'None',
+        'overlay_alerts': 'Alerts only',
+        'overlay_hulls': 'Eyes, mouth and head pose',
+        'overlay_debug': 'All landmarks (debug)',
+        'searching_cameras': 'Searching...',
+        'loading_models': 'Loading model...',
+        'models_ready': 'Model ready',
+        'models_failed': 'Model could not be loaded',
     },
     'es': {
         'title': 'Detección de Fatiga y Somnolencia',
@@ -102,10 +157,29 @@ LANGUAGES = {
         'export_title': 'Exportar Video',
         'export_success': '¡Video exportado exitosamente!',
         'export_error': 'Error al exportar video',
+        'parallel_export': 'Exportación en paralelo',
+        # Detection settings
+        'detect_interval': 'Detectar cada N frames:',
+        'roi_margin': 'Margen de búsqueda (0 = no):',
         # Menu
         'language': 'Idioma',
         'english': 'Inglés',
         'spanish': 'Español',
+        # Profiling
+        'profiling': 'Perfilado',
+        'profile_enable': 'Medir etapas del pipeline',
+        'profile_panel': 'Tiempos por etapa',
+        'profile_save': 'Guardar tiempos (JSON)...',
+        'profile_empty': 'Sin tiempos, active el perfilado e inicie la detección',
+        'overlay': 'Superposición',
+        'overlay_none': 'Ninguna',
+        'overlay_alerts': 'Solo alertas',
+        'overlay_hulls': 'Ojos, boca y pose de cabeza',
+        'overlay_debug': 'Todos los puntos (depuración)',
+        'searching_cameras': 'Buscando...',
+        'loading_models': 'Cargando modelo...',
+        'models_ready': 'Modelo listo',
+        'models_failed': 'No se pudo cargar el modelo',
     }
 }
 
@@ -127,26 +201,54 @@ class DrowsinessDetectorGUI:
         self.video_source = None  # Can be camera index (int) or video file path (str)
         self.source_type = None   # 'camera' or 'video'
         self.current_frame = None  # Current frame for display
-        self.vs = None  # VideoCapture or VideoStream object
+        self.vs = None  # cv2.VideoCapture, owned by the capture stage
+        
+        # Live pipeline: capture thread -> analysis thread -> display (Tk)
+        self.capture = None
+        self.capture_queue = None
+        self.display_queue = None
+        self.latency_ms = 0.0  # capture to display, moving average
+        self.display_fps = 0.0
+        self.last_display_time = None
+        self.display_image = None  # PhotoImage reused for every frame
         
         # Video playback
         self.video_total_frames = 0
         self.video_fps = 0
+        self.video_index = None  # PlaybackController.FrameIndex, built in the background
         self.current_frame_pos = 0
         self.is_video_playing = False
         
         # Video export
-        self.export_writer = None
         self.is_exporting = False
         
-        # Available cameras (check on startup)
-        self.available_cameras = self.detect_cameras()
+        # Stage timings, None while profiling is off
+        self.profiler = None
+        self.profile_var = tk.BooleanVar(value=False)
+        self.profile_window = None
+        
+        # Overlay detail level of the display and the exports, copied to a
+        # plain attribute for the worker threads
+        self.overlay_level = 'hulls'
+        self.overlay_var = tk.StringVar(value=self.overlay_level)
+        
+        # Startup steps in seconds, logged once all of them are done
+        self.startup = {'imports': IMPORT_SECONDS}
+        
+        # Cameras and models are found in the background, the window shows
+        # up right away and tells when they are ready
+        self.available_cameras = []
+        self.cameras_ready = False
+        self.models_state = 'loading_models'
         
         # Create GUI
+        start = time.perf_counter()
         self.create_widgets()
+        self.startup['widgets'] = time.perf_counter() - start
         
-        # Load dlib models (one time)
-        self.load_models()
+        threading.Thread(target=self.discover_cameras, daemon=True).start()
+        threading.Thread(target=self.load_models, daemon=True).start()
+        self.root.after(0, self.on_window_shown)
     
     def t(self, key):
         """Get translated string"""
@@ -165,35 +267,63 @@ class DrowsinessDetectorGUI:
                 pass
         return cameras
     
+    def discover_cameras(self):
+        """Background thread: find the cameras, each missing index can take seconds"""
+        start = time.perf_counter()
+        cameras = self.detect_cameras()
+        seconds = time.perf_counter() - start
+        self.root.after(0, lambda: self.set_cameras(cameras, seconds))
+    
+    def set_cameras(self, cameras, seconds):
+        self.available_cameras = cameras
+        self.cameras_ready = True
+        self.startup['cameras'] = seconds
+        if cameras:
+            self.camera_combo.config(values=[f"Camera {i}" for i in cameras], state="readonly")
+            self.camera_combo.current(0)
+            self.use_camera_btn.config(state="normal")
+        else:
+            self.camera_var.set(self.t('no_cameras'))
+        self.log_startup()
+    
     def load_models(self):
-        """Load dlib face detector and landmark predictor"""
-        print("[INFO] Loading facial landmark predictor...")
-        self.detector = dlib.get_frontal_face_detector()
-        self.predictor = dlib.shape_predictor(
-            './dlib_shape_predictor/shape_predictor_68_face_landmarks.dat')
-        
-        # 2D image points
-        self.image_points = np.array([
-            (359, 391),     # Nose tip 34
-            (399, 561),     # Chin 9
-            (337, 297),     # Left eye left corner 37
-            (513, 301),     # Right eye right corner 46
-            (345, 465),     # Left Mouth corner 49
-            (453, 469)      # Right mouth corner 55
-        ], dtype="double")
-        
-        (self.lStart, self.lEnd) = face_utils.FACIAL_LANDMARKS_IDXS["left_eye"]
-        (self.rStart, self.rEnd) = face_utils.FACIAL_LANDMARKS_IDXS["right_eye"]
-        
-        # Thresholds
-        self.EYE_AR_THRESH = 0.25
-        self.MOUTH_AR_THRESH = 0.79
-        self.EYE_AR_CONSEC_FRAMES = 3
-        self.COUNTER = 0
-        
-        (self.mStart, self.mEnd) = (49, 68)
-        
-        print("[INFO] Models loaded successfully")
+        """Background thread: load the landmark predictor (shared by all workers)
+
+        Analyzers created before it is done wait for it in ModelRegistry.
+        """
+        start = time.perf_counter()
+        try:
+            import ModelRegistry
+            ModelRegistry.get_predictor()
+        except Exception as e:
+            print(f"[ERROR] Could not load models: {e}")
+            state = 'models_failed'
+        else:
+            print("[INFO] Models loaded successfully")
+            print(ModelRegistry.report())
+            state = 'models_ready'
+        seconds = time.perf_counter() - start
+        self.root.after(0, lambda: self.set_models_state(state, seconds))
+    
+    def set_models_state(self, state, seconds):
+        self.models_state = state
+        self.startup['models'] = seconds
+        self.readiness_var.set(self.t(state))
+        self.readiness_label.config(fg="red" if state == 'models_failed' else "green")
+        self.log_startup()
+    
+    def on_window_shown(self):
+        self.startup['window'] = time.perf_counter() - STARTUP_START
+        self.log_startup()
+    
+    def log_startup(self):
+        """Print how long each startup step took, once all are done"""
+        if not all(k in self.startup for k in ('window', 'cameras', 'models')):
+            return
+        s = {k: v * 1000 for k, v in self.startup.items()}
+        print(f"[INFO] Startup: window shown after {s['window']:.0f} ms "
+              f"(imports {s['imports']:.0f} ms, widgets {s['widgets']:.0f} ms); "
+              f"in the background: cameras {s['cameras']:.0f} ms, models {s['models']:.0f} ms")
     
     def create_widgets(self):
         """Create GUI widgets"""
@@ -246,29 +376,27 @@ class DrowsinessDetectorGUI:
         
         tk.Label(camera_frame, text=self.t('camera')).pack(side="left", padx=5)
         
-        if self.available_cameras:
-            self.camera_var = tk.StringVar()
-            self.camera_combo = ttk.Combobox(
-                camera_frame, 
-                textvariable=self.camera_var,
-                values=[f"Camera {i}" for i in self.available_cameras],
-                state="readonly",
-                width=15
-            )
-            self.camera_combo.current(0)
-            self.camera_combo.pack(side="left", padx=5)
-            
-            self.use_camera_btn = tk.Button(
-                camera_frame,
-                text=self.t('select'),
-                command=self.use_camera,
-                bg="#4CAF50",
-                fg="white",
-                width=10
-            )
-            self.use_camera_btn.pack(side="left", padx=5)
-        else:
-            tk.Label(camera_frame, text=self.t('no_cameras'), fg="red").pack(side="left", padx=5)
+        # Filled in by discover_cameras
+        self.camera_var = tk.StringVar(value=self.t('searching_cameras'))
+        self.camera_combo = ttk.Combobox(
+            camera_frame, 
+            textvariable=self.camera_var,
+            values=[],
+            state="disabled",
+            width=15
+        )
+        self.camera_combo.pack(side="left", padx=5)
+        
+        self.use_camera_btn = tk.Button(
+            camera_frame,
+            text=self.t('select'),
+            command=self.use_camera,
+            bg="#4CAF50",
+            fg="white",
+            width=10,
+            state="disabled"
+        )
+        self.use_camera_btn.pack(side="left", padx=5)
         
         # OR label
         or_label = tk.Label(self.left_panel, text="- OR -")
@@ -369,6 +497,46 @@ class DrowsinessDetectorGUI:
         )
         self.export_btn.pack(pady=5)
         
+        # Parallel export uses one worker process per CPU core
+        self.parallel_export_var = tk.BooleanVar(value=(os.cpu_count() or 1) > 1)
+        self.parallel_export_check = tk.Checkbutton(
+            self.video_controls_frame,
+            text=self.t('parallel_export'),
+            variable=self.parallel_export_var
+        )
+        self.parallel_export_check.pack(pady=2)
+        
+        # Detection settings - faces are tracked between full detections
+        settings_frame = tk.Frame(self.left_panel)
+        settings_frame.pack(pady=5)
+        
+        tk.Label(settings_frame, text=self.t('detect_interval')).pack(side="left", padx=5)
+        
+        self.detect_interval_var = tk.IntVar(value=1)
+        self.detect_interval_spin = tk.Spinbox(
+            settings_frame,
+            from_=1, to=30,
+            textvariable=self.detect_interval_var,
+            width=4
+        )
+        self.detect_interval_spin.pack(side="left", padx=5)
+        
+        # Detections search around the last face, grown by this many face
+        # sizes on every side; the status line shows the hit rate
+        roi_frame = tk.Frame(self.left_panel)
+        roi_frame.pack(pady=5)
+        
+        tk.Label(roi_frame, text=self.t('roi_margin')).pack(side="left", padx=5)
+        
+        self.roi_margin_var = tk.DoubleVar(value=0.0)
+        self.roi_margin_spin = tk.Spinbox(
+            roi_frame,
+            from_=0.0, to=3.0, increment=0.25,
+            textvariable=self.roi_margin_var,
+            width=5
+        )
+        self.roi_margin_spin.pack(side="left", padx=5)
+        
         # Control buttons
         button_frame = tk.Frame(self.left_panel)
         button_frame.pack(pady=20)
@@ -403,6 +571,12 @@ class DrowsinessDetectorGUI:
         status_label = tk.Label(self.left_panel, textvariable=self.status_var, fg="blue", font=("Arial", 10))
         status_label.pack(pady=10)
         
+        # Model readiness, detection can start before, it waits for the model
+        self.readiness_var = tk.StringVar(value=self.t(self.models_state))
+        self.readiness_label = tk.Label(self.left_panel, textvariable=self.readiness_var,
+                                        fg="gray", font=("Arial", 9))
+        self.readiness_label.pack()
+        
         # Instructions
         self.instructions_var = tk.StringVar(value=self.t('instructions'))
         instructions = tk.Label(
@@ -431,6 +605,76 @@ class DrowsinessDetectorGUI:
         menubar.add_cascade(label=self.t('language'), menu=lang_menu)
         lang_menu.add_radiobutton(label=self.t('english'), command=lambda: self.set_language('en'))
         lang_menu.add_radiobutton(label=self.t('spanish'), command=lambda: self.set_language('es'))
+        
+        # Profiling menu
+        profile_menu = tk.Menu(menubar, tearoff=0)
+        menubar.add_cascade(label=self.t('profiling'), menu=profile_menu)
+        profile_menu.add_checkbutton(label=self.t('profile_enable'), variable=self.profile_var,
+                                     command=self.toggle_profiling)
+        profile_menu.add_command(label=self.t('profile_panel'), command=self.show_profile_panel)
+        profile_menu.add_command(label=self.t('profile_save'), command=self.save_profile)
+        
+        # Overlay menu, read on every frame so it applies while running
+        overlay_menu = tk.Menu(menubar, tearoff=0)
+        menubar.add_cascade(label=self.t('overlay'), menu=overlay_menu)
+        for level in OVERLAY_LEVELS:
+            overlay_menu.add_radiobutton(label=self.t('overlay_' + level), value=level,
+                                         variable=self.overlay_var, command=self.set_overlay)
+    
+    def set_overlay(self):
+        self.overlay_level = self.overlay_var.get()
+    
+    def toggle_profiling(self):
+        """Switch the stage timers on or off, running pipelines pick it up on the next frame"""
+        if self.profile_var.get():
+            self.profiler = Profiler()
+        else:
+            self.profiler = None
+    
+    def show_profile_panel(self):
+        """Open the window with the rolling stage timings"""
+        if self.profile_window is not None and self.profile_window.winfo_exists():
+            self.profile_window.lift()
+            return
+        self.profile_window = tk.Toplevel(self.root)
+        self.profile_window.title(self.t('profile_panel'))
+        self.profile_text = tk.Label(self.profile_window, font=("Courier", 10), justify="left",
+                                     anchor="nw", padx=10, pady=10)
+        self.profile_text.pack(fill="both", expand=True)
+        self.refresh_profile_panel()
+    
+    def refresh_profile_panel(self):
+        """Redraw the stage timings panel while it is open"""
+        if self.profile_window is None or not self.profile_window.winfo_exists():
+            self.profile_window = None
+            return
+        if self.profiler is not None and self.profiler.summary():
+            text = self.profiler.format() + "\n\n(ms, last frames)"
+        else:
+            text = self.t('profile_empty')
+        self.profile_text.config(text=text)
+        self.root.after(PROFILE_REFRESH_MS, self.refresh_profile_panel)
+    
+    def save_profile(self):
+        """Write the current stage timings to a JSON file chosen by the user"""
+        if self.profiler is None:
+            messagebox.showwarning(self.t('profiling'), self.t('profile_empty'))
+            return
+        filename = filedialog.asksaveasfilename(
+            title=self.t('profile_save'),
+            defaultextension=".json",
+            filetypes=[("JSON files", "*.json")],
+            initialfile=PROFILE_PATH
+        )
+        if filename:
+            self.profiler.dump(filename)
+    
+    def on_close(self):
+        """Window closed, keep the stage timings if profiling was on"""
+        self.is_running = False
+        if self.profiler is not None and self.profiler.summary():
+            self.profiler.dump(PROFILE_PATH)
+        self.root.destroy()
     
     def set_language(self, lang):
         """Change language without restart"""
@@ -439,11 +683,32 @@ class DrowsinessDetectorGUI:
         # Update title
         self.root.title(self.t('title'))
         self.title_label.config(text=self.t('title'))
+        self.readiness_var.set(self.t(self.models_state))
+        if not self.cameras_ready:
+            self.camera_var.set(self.t('searching_cameras'))
+        elif not self.available_cameras:
+            self.camera_var.set(self.t('no_cameras'))
         
         # Rebuild menu
         self.root.config(menu='')  # Clear menu
         self.create_menu()
     
+    def analyzer_options(self):
+        """FrameAnalyzer settings chosen in the GUI"""
+        from FaceDetectors import detector_spec
+        try:
+            detect_interval = max(1, int(self.detect_interval_var.get()))
+        except (tk.TclError, ValueError):
+            detect_interval = 1
+        try:
+            roi_margin = max(0.0, float(self.roi_margin_var.get()))
+        except (tk.TclError, ValueError):
+            roi_margin = 0.0
+        return {'detect_interval': detect_interval,
+                'roi_margin': roi_margin or None,
+                'roi_fallback': ROI_FALLBACK,
+                'detector_backend': detector_spec()}
+    
     def use_camera(self):
         """Set video source to selected camera"""
         if not self.available_cameras:
@@ -503,8 +768,30 @@ class DrowsinessDetectorGUI:
         self.progress_scale.config(to=self.video_total_frames)
         self.video_controls_frame.pack(pady=10, padx=10, fill="x")
         
+        # The keyframe index takes a moment on the first open of a video
+        self.video_index = None
+        threading.Thread(target=self.index_video, args=(video_path,), daemon=True).start()
+        
         self.status_var.set(f"Video selected - Click {self.t('start')}")
     
+    def index_video(self, video_path):
+        """Background thread: load or build the keyframe index of video_path"""
+        try:
+            from PlaybackController import load_index
+            index = load_index(video_path)
+        except Exception as e:
+            print(f"[WARNING] Could not index {video_path}, seeking without it: {e}")
+            return
+        self.root.after(0, lambda: self.set_video_index(video_path, index))
+    
+    def set_video_index(self, video_path, index):
+        if video_path != self.video_source:
+            return
+        self.video_index = index
+        # The index counts the frames exactly, the container only estimates
+        self.video_total_frames = index.frames
+        self.progress_scale.config(to=index.frames - 1)
+    
     def toggle_play_pause(self):
         """Toggle play/pause"""
         if self.source_type != 'video':
@@ -519,37 +806,44 @@ class DrowsinessDetectorGUI:
     
     def forward_10s(self):
         """Skip forward 10 seconds"""
-        if self.source_type != 'video' or not hasattr(self, 'vs') or self.vs is None:
+        if self.source_type != 'video' or self.capture is None:
             return
         
-        # Skip 10 seconds worth of frames
-        skip_frames = int(self.video_fps * 10)
-        new_pos = min(self.current_frame_pos + skip_frames, self.video_total_frames - 1)
+        new_pos = min(self.skip_seconds(10), self.video_total_frames - 1)
         
-        self.vs.set(cv2.CAP_PROP_POS_FRAMES, new_pos)
-        self.current_frame_pos = new_pos
+        self.seek(new_pos)
         self.progress_var.set(new_pos)
     
     def backward_10s(self):
         """Skip backward 10 seconds"""
-        if self.source_type != 'video' or not hasattr(self, 'vs') or self.vs is None:
+        if self.source_type != 'video' or self.capture is None:
             return
         
-        # Skip 10 seconds worth of frames
-        skip_frames = int(self.video_fps * 10)
-        new_pos = max(self.current_frame_pos - skip_frames, 0)
+        new_pos = max(self.skip_seconds(-10), 0)
         
-        self.vs.set(cv2.CAP_PROP_POS_FRAMES, new_pos)
-        self.current_frame_pos = new_pos
+        self.seek(new_pos)
         self.progress_var.set(new_pos)
     
+    def skip_seconds(self, seconds):
+        """Frame seconds away from the current one, by timestamp when indexed"""
+        index = self.video_index
+        if index is not None:
+            return index.frame_at(index.time_of(self.current_frame_pos) + seconds)
+        return self.current_frame_pos + int(self.video_fps * seconds)
+    
     def on_seek(self, value):
         """Handle seek"""
-        if self.source_type != 'video' or not hasattr(self, 'vs') or self.vs is None:
+        if self.source_type != 'video' or self.capture is None:
             return
         
-        frame_pos = int(float(value))
-        self.vs.set(cv2.CAP_PROP_POS_FRAMES, frame_pos)
+        self.seek(int(float(value)))
+    
+    def seek(self, frame_pos):
+        """Jump to frame_pos, the playback thread performs the actual seek"""
+        if self.capture is not None:
+            self.capture.seek(frame_pos)
+        if self.display_queue is not None:
+            self.display_queue.clear()
         self.current_frame_pos = frame_pos
     
     def export_video(self):
@@ -562,7 +856,7 @@ class DrowsinessDetectorGUI:
         filename = filedialog.asksaveasfilename(
             title=self.t('export_title'),
             defaultextension=".mp4",
-            filetypes=[("MP4 files", "*.mp4")],
+            filetypes=[("MP4 files", "*.mp4"), ("AVI files", "*.avi"), ("MKV files", "*.mkv")],
             initialfile="drowsiness_analysis.mp4"
         )
         
@@ -578,168 +872,49 @@ class DrowsinessDetectorGUI:
         self.status_var.set("Exporting video... Please wait.")
         
         # Start export in separate thread
-        export_thread = threading.Thread(target=self.run_full_export)
+        workers = None if self.parallel_export_var.get() else 1
+        export_thread = threading.Thread(target=self.run_export, args=(workers,))
         export_thread.daemon = True
         export_thread.start()
     
-    def run_full_export(self):
-        """Run the full video export - processes entire video from frame 0"""
-        # Initialize dlib
-        detector = dlib.get_frontal_face_detector()
-        predictor = dlib.shape_predictor('./dlib_shape_predictor/shape_predictor_68_face_landmarks.dat')
-        
-        # Open video
-        vs = cv2.VideoCapture(self.video_source)
-        total_frames = int(vs.get(cv2.CAP_PROP_FRAME_COUNT))
-        fps = vs.get(cv2.CAP_PROP_FPS)
-        
-        # Get first frame to get dimensions
-        ret, frame = vs.read()
-        if not ret:
-            vs.release()
-            self.root.after(0, lambda: messagebox.showerror(self.t('export_error'), "Could not read video"))
-            return
-        
-        frame = cv2.resize(frame, (800, 600))
-        h, w = frame.shape[:2]
-        
-        # Create video writer
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        writer = cv2.VideoWriter(self.export_path, fourcc, fps, (w, h))
-        
-        # Reset to beginning
-        vs.set(cv2.CAP_PROP_POS_FRAMES, 0)
-        
-        frame_height = 576
-        frame_count = 0
-        
-        # Get translated messages
-        face_text = self.t('face_found')
-        eyes_text = self.t('eyes_closed')
-        yawn_text = self.t('yawning')
-        tilt_text = self.t('head_tilt')
-        mar_text = self.t('mar')
-        
-        while True:
-            ret, frame = vs.read()
-            if not ret:
-                break
-            
-            frame_count += 1
-            
-            # Update status every 30 frames
-            if frame_count % 30 == 0:
-                progress = int((frame_count / total_frames) * 100)
-                self.root.after(0, lambda p=progress: self.status_var.set(f"Exporting... {p}%"))
-            
-            # Process frame
-            try:
-                if len(frame.shape) == 2:
-                    frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
-                elif len(frame.shape) == 3 and frame.shape[2] == 4:
-                    frame = frame[:, :, :3]
-                
-                if frame.dtype != np.uint8:
-                    frame = cv2.normalize(frame, None, 0, 255, cv2.NORM_MINMAX, dtype=cv2.CV_8U)
-            except:
-                continue
-            
-            frame = cv2.resize(frame, (800, 600))
-            
-            if frame.dtype != np.uint8:
-                frame = frame.astype(np.uint8)
-            
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY).astype('uint8')
-            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB).astype('uint8')
-            
-            if not rgb.flags['C_CONTIGUOUS']:
-                rgb = np.ascontiguousarray(rgb)
-            
-            if gray is None or gray.size == 0:
-                writer.write(frame)
-                continue
-            
-            size = gray.shape
-            
-            # Detect faces
-            rects = detector(rgb)
-            
-            if len(rects) > 0:
-                text = f"{len(rects)} {face_text}"
-                cv2.putText(frame, text, (10, 20),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
-            
-            for rect in rects:
-                (bX, bY, bW, bH) = face_utils.rect_to_bb(rect)
-                cv2.rectangle(frame, (bX, bY), (bX + bW, bY + bH), (0, 255, 0), 2)
-                
-                shape = predictor(rgb, rect)
-                shape = face_utils.shape_to_np(shape)
-                
-                # Eye detection
-                leftEye = shape[self.lStart:self.lEnd]
-                rightEye = shape[self.rStart:self.rEnd]
-                leftEAR = eye_aspect_ratio(leftEye)
-                rightEAR = eye_aspect_ratio(rightEye)
-                ear = (leftEAR + rightEAR) / 2.0
-                
-                leftEyeHull = cv2.convexHull(leftEye)
-                rightEyeHull = cv2.convexHull(rightEye)
-                cv2.drawContours(frame, [leftEyeHull], -1, (0, 255, 0), 1)
-                cv2.drawContours(frame, [rightEyeHull], -1, (0, 255, 0), 1)
-                
-                if ear < self.EYE_AR_THRESH:
-                    cv2.putText(frame, eyes_text, (300, 40),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
-                
-                # Mouth detection
-                mouth = shape[self.mStart:self.mEnd]
-                mouthMAR = mouth_aspect_ratio(mouth)
-                mar = mouthMAR
-                mouthHull = cv2.convexHull(mouth)
-                cv2.drawContours(frame, [mouthHull], -1, (0, 255, 0), 1)
-                cv2.putText(frame, f"{mar_text}: {mar:.2f}", (500, 20), 
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
-                
-                if mar > self.MOUTH_AR_THRESH:
-                    cv2.putText(frame, yawn_text, (500, 50),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
-                
-                # Head pose
-                for (i, (x, y)) in enumerate(shape):
-                    if i == 33:
-                        self.image_points[0] = np.array([x, y], dtype='double')
-                    elif i == 8:
-                        self.image_points[1] = np.array([x, y], dtype='double')
-                    elif i == 36:
-                        self.image_points[2] = np.array([x, y], dtype='double')
-                    elif i == 45:
-                        self.image_points[3] = np.array([x, y], dtype='double')
-                    elif i == 48:
-                        self.image_points[4] = np.array([x, y], dtype='double')
-                    elif i == 54:
-                        self.image_points[5] = np.array([x, y], dtype='double')
-                
-                (head_tilt_degree, start_point, end_point, 
-                    end_point_alt) = getHeadTiltAndCoords(size, self.image_points, frame_height)
-                
-                if head_tilt_degree:
-                    cv2.putText(frame, f"{tilt_text} {head_tilt_degree[0]:.1f}°", (10, 50),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
-            
-            # Write frame
-            writer.write(frame)
+    def run_export(self, workers):
+        """Export the whole video in checkpointed segments
+
+        workers=1 renders the segments one after the other in this thread,
+        None uses all CPU cores. An export of the same file that was
+        interrupted resumes from its finished segments.
+        """
+        def progress(done, total, fps, eta):
+            p = int((done / total) * 100)
+            status = f"Exporting... {p}% ({fps:.1f} fps"
+            if eta is not None:
+                status += f", {int(eta) // 60}:{int(eta) % 60:02d} left"
+            self.root.after(0, lambda: self.status_var.set(status + ")"))
         
-        # Cleanup
-        writer.release()
-        vs.release()
+        try:
+            import ParallelExport
+            resume = ParallelExport.export_progress(self.export_path)
+            if resume is not None:
+                p = int(resume[0] / resume[1] * 100)
+                self.root.after(0, lambda: self.status_var.set(f"Resuming export... {p}%"))
+            stats = ParallelExport.export_video(
+                self.video_source, self.export_path,
+                labels=LANGUAGES[self.current_lang], overlay=self.overlay_level,
+                analyzer_options=self.analyzer_options(), workers=workers,
+                progress=progress, encoder=ENCODER_BACKEND)
+        except Exception as e:
+            print(f"[ERROR] Export failed: {e}")
+            self.root.after(0, lambda: self.export_btn.config(state="normal"))
+            self.root.after(0, lambda m=str(e): messagebox.showerror(self.t('export_error'), m))
+            return
         
         # Update UI
         self.root.after(0, lambda: self.status_var.set(self.t('ready')))
         self.root.after(0, lambda: self.export_btn.config(state="normal"))
         self.root.after(0, lambda: messagebox.showinfo(
             self.t('export_title'), 
-            f"{self.t('export_success')}\nFile: {self.export_path}"
+            f"{self.t('export_success')}\nFile: {self.export_path}\n{stats['fps']:.1f} fps, "
+            f"{stats['encoder']}: {stats['encode_fps']:.1f} fps"
         ))
     
     def start_detection(self):
@@ -773,243 +948,241 @@ class DrowsinessDetectorGUI:
         self.start_btn.config(state="normal")
         self.stop_btn.config(state="disabled")
         self.status_var.set(self.t('stopped'))
-        
-        # Release export writer
-        if self.export_writer is not None:
-            self.export_writer.release()
-            self.export_writer = None
     
     def update_video_display(self, frame):
-        """Update the video display label with the current frame"""
+        """Update the video display label with the current frame
+
+        The frame is resized once to fit DISPLAY_SIZE and pasted into a
+        PhotoImage that is reused while the displayed size stays the same.
+        """
         if frame is None:
             return
-        
-        # Write to export video
-        if self.is_exporting and self.export_writer is None and self.source_type == 'video':
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            h, w = frame.shape[:2]
-            self.export_writer = cv2.VideoWriter(self.export_path, fourcc, 30, (w, h))
-        
-        if self.export_writer is not None:
-            self.export_writer.write(frame)
-        
-        # Convert frame from BGR to RGB for display
+        profiler = self.profiler
+        if profiler is not None:
+            start = time.perf_counter()
+        
+        (h, w) = frame.shape[:2]
+        scale = min(DISPLAY_SIZE[0] / w, DISPLAY_SIZE[1] / h)
+        size = (max(1, int(w * scale)), max(1, int(h * scale)))
+        frame = cv2.resize(frame, size, interpolation=cv2.INTER_LINEAR)
         frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
         
-        # Convert to PIL Image
-        pil_image = Image.fromarray(frame_rgb)
-        
-        # Resize to fit the display label (maintain aspect ratio)
-        display_width = 700
-        display_height = 550
-        pil_image.thumbnail((display_width, display_height), Image.LANCZOS)
-        
-        # Convert to Tkinter compatible image
-        tk_image = ImageTk.PhotoImage(pil_image)
-        
-        # Update label
-        self.video_label.imagemostrar = tk_image  # Keep reference
-        self.video_label.config(image=tk_image, text="")
+        if self.display_image is None or \
+                (self.display_image.width(), self.display_image.height()) != size:
+            self.display_image = ImageTk.PhotoImage('RGB', size)
+            self.video_label.config(image=self.display_image, text="")
+        self.display_image.paste(Image.fromarray(frame_rgb))
+        if profiler is not None:
+            profiler.record('display', start)
         
         # Update progress bar for video
         if self.source_type == 'video':
             self.progress_var.set(self.current_frame_pos)
     
     def run_detection(self):
-        """Run the drowsiness detection algorithm"""
-        # Initialize dlib detector in THIS thread (important for thread safety)
-        print("[INFO] Initializing dlib detector in worker thread...")
-        detector = dlib.get_frontal_face_detector()
-        predictor = dlib.shape_predictor('./dlib_shape_predictor/shape_predictor_68_face_landmarks.dat')
-        print("[INFO] Detector initialized successfully")
+        """Analysis stage of the live pipeline
+
+        A CaptureStage (camera) or PlaybackController (video file) thread
+        reads the source into capture_queue, this thread analyzes and
+        annotates the frames into display_queue and poll_display shows them
+        from the Tk thread.
+        """
+        from FrameAnalyzer import FrameAnalyzer
+        from LandmarkCache import open_cache
+        from PlaybackController import PlaybackController, load_index
+        from Overlay import draw_overlay, lower_level
+
+        frame_count = 0
+        cache = None
+        camera = self.source_type == 'camera'
         
         # Initialize video source
-        if self.source_type == 'camera':
-            self.vs = VideoStream(src=self.video_source).start()
-            time.sleep(2.0)
+        self.vs = cv2.VideoCapture(self.video_source)
+        source_fps = self.vs.get(cv2.CAP_PROP_FPS) or 30
+        
+        # The analyzer takes a detector for THIS thread from the registry
+        # (important for thread safety) and the shared predictor
+        analyzer = FrameAnalyzer(**self.analyzer_options(), landmark_workers=LANDMARK_WORKERS,
+                                 fatigue_fps=source_fps)
+        if not camera:
+            # Replay from the landmark cache if an export already filled it
+            cache = open_cache(self.video_source, analyzer.cache_settings())
+            if cache is not None and not cache.complete:
+                cache = None
+        
+        # A camera keeps only its newest frames, a video file loses none.
+        # The display shows the newest analyzed frame and skips stale ones
+        if camera:
+            capture_queue = FrameQueue(CAMERA_QUEUE_SIZE, drop_oldest=True)
         else:
-            self.vs = cv2.VideoCapture(self.video_source)
-            self.current_frame_pos = 0
-        
-        frame_height = 576
-        self.COUNTER = 0
+            capture_queue = FrameQueue(VIDEO_CAPTURE_QUEUE_SIZE, drop_oldest=False)
+        display_queue = FrameQueue(1, drop_oldest=True)
+        # A camera must be analyzed in real time, when frames take longer
+        # than the camera's frame interval the analysis quality steps down.
+        # Video files are never dropped, so they always run at full quality
+        quality = None
+        if camera:
+            quality = QualityController(analyzer, 1000.0 / source_fps)
+        
+        # Video files play through a PlaybackController, which seeks with
+        # the keyframe index and decodes ahead into capture_queue
+        if camera:
+            capture = CaptureStage(self.vs, capture_queue, profiler=self.profiler)
+        else:
+            index = self.video_index
+            if index is None:
+                try:
+                    index = load_index(self.video_source)
+                except Exception as e:
+                    print(f"[WARNING] Could not index {self.video_source}, seeking without it: {e}")
+            capture = PlaybackController(self.vs, capture_queue, index,
+                                         paused=lambda: self.is_paused,
+                                         profiler=self.profiler)
+        analyzer.profiler = self.profiler
+        self.capture_queue = capture_queue
+        self.display_queue = display_queue
+        self.capture = capture
+        self.latency_ms = 0.0
+        self.display_fps = 0.0
+        self.last_display_time = None
+        writer = None
         
         print(f"[INFO] Starting detection with source type: {self.source_type}")
+        capture.start()
+        self.root.after(0, self.poll_display, display_queue)
         
         while self.is_running:
-            # Check for pause
-            if self.is_paused and self.source_type == 'video':
-                time.sleep(0.1)
-                continue
-            
-            # Read frame
-            if self.source_type == 'camera':
-                frame = self.vs.read()
-                if frame is None:
-                    print("[ERROR] Failed to read frame from camera")
-                    break
-            else:
-                ret, frame = self.vs.read()
-                if not ret or frame is None:
-                    print("[INFO] Video ended or failed to read, stopping...")
+            packet = capture_queue.get(timeout=0.1)
+            if packet is None:
+                if capture.finished:
+                    if camera:
+                        print("[ERROR] Failed to read frame from camera")
+                    else:
+                        print("[INFO] Video ended or failed to read, stopping...")
                     break
-                
-                self.current_frame_pos = int(self.vs.get(cv2.CAP_PROP_POS_FRAMES))
-            
-            # Validate frame
-            if frame is None or frame.size == 0:
                 continue
             
-            # Ensure frame is in correct format
-            try:
-                if len(frame.shape) == 2:
-                    frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
-                elif len(frame.shape) == 3 and frame.shape[2] == 4:
-                    frame = frame[:, :, :3]
-                
-                if frame.dtype != np.uint8:
-                    frame = cv2.normalize(frame, None, 0, 255, cv2.NORM_MINMAX, dtype=cv2.CV_8U)
-            except Exception as e:
-                print(f"[ERROR] Frame format conversion failed: {e}")
-                continue
+            # Profiling can be switched on and off while running
+            profiler = self.profiler
+            analyzer.profiler = profiler
+            capture.profiler = profiler
             
-            # Resize
-            frame = cv2.resize(frame, (800, 600))
+            # Faces, counters and fatigue windows from before a seek do
+            # not belong to the frames after it
+            if packet.seeked:
+                analyzer.reset(packet.index)
             
-            if frame.dtype != np.uint8:
-                frame = frame.astype(np.uint8)
-            
-            # Convert to grayscale and RGB
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY).astype('uint8')
-            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB).astype('uint8')
-            
-            if not rgb.flags['C_CONTIGUOUS']:
-                rgb = np.ascontiguousarray(rgb)
-            
-            if gray is None or gray.size == 0:
+            # Analyze frame
+            start = time.perf_counter()
+            cached = cache.read(packet.index) if cache is not None else None
+            result = analyzer.analyze(packet.frame, cached)
+            if result is None:
                 continue
             
-            size = gray.shape
-            
-            # Detect faces
-            rects = detector(rgb)
+            packet.result = result
+            overlay = self.overlay_level
+            if quality is not None:
+                overlay = lower_level(overlay, quality.overlay)
+            packet.frame = draw_overlay(result, overlay, LANGUAGES[self.current_lang], profiler)
+            if quality is not None:
+                quality.update((time.perf_counter() - start) * 1000)
             
-            # Get translated messages
-            face_text = self.t('face_found')
-            eyes_text = self.t('eyes_closed')
-            yawn_text = self.t('yawning')
-            tilt_text = self.t('head_tilt')
-            mar_text = self.t('mar')
+            # Write to export video, every analyzed frame even if the
+            # display skips it
+            if self.is_exporting and not camera:
+                if writer is None:
+                    h, w = packet.frame.shape[:2]
+                    writer = VideoEncoder(self.export_path, source_fps, (w, h),
+                                          ENCODER_BACKEND, profiler=profiler)
+                writer.profiler = profiler
+                writer.write(packet.frame)
             
-            if len(rects) > 0:
-                text = f"{len(rects)} {face_text}"
-                cv2.putText(frame, text, (10, 20),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
-            
-            # Process each detected face
-            for rect in rects:
-                (bX, bY, bW, bH) = face_utils.rect_to_bb(rect)
-                cv2.rectangle(frame, (bX, bY), (bX + bW, bY + bH), (0, 255, 0), 2)
-                
-                shape = predictor(rgb, rect)
-                shape = face_utils.shape_to_np(shape)
-                
-                # Eye detection
-                leftEye = shape[self.lStart:self.lEnd]
-                rightEye = shape[self.rStart:self.rEnd]
-                leftEAR = eye_aspect_ratio(leftEye)
-                rightEAR = eye_aspect_ratio(rightEye)
-                ear = (leftEAR + rightEAR) / 2.0
-                
-                leftEyeHull = cv2.convexHull(leftEye)
-                rightEyeHull = cv2.convexHull(rightEye)
-                cv2.drawContours(frame, [leftEyeHull], -1, (0, 255, 0), 1)
-                cv2.drawContours(frame, [rightEyeHull], -1, (0, 255, 0), 1)
-                
-                if ear < self.EYE_AR_THRESH:
-                    self.COUNTER += 1
-                    if self.COUNTER >= self.EYE_AR_CONSEC_FRAMES:
-                        cv2.putText(frame, eyes_text, (300, 40),
-                                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
-                else:
-                    self.COUNTER = 0
-                
-                # Mouth detection
-                mouth = shape[self.mStart:self.mEnd]
-                mouthMAR = mouth_aspect_ratio(mouth)
-                mar = mouthMAR
-                mouthHull = cv2.convexHull(mouth)
-                cv2.drawContours(frame, [mouthHull], -1, (0, 255, 0), 1)
-                cv2.putText(frame, f"{mar_text}: {mar:.2f}", (500, 20), 
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
-                
-                if mar > self.MOUTH_AR_THRESH:
-                    cv2.putText(frame, yawn_text, (500, 50),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
-                
-                # Head pose estimation
-                for (i, (x, y)) in enumerate(shape):
-                    if i == 33:
-                        self.image_points[0] = np.array([x, y], dtype='double')
-                        cv2.circle(frame, (x, y), 2, (0, 255, 0), -1)
-                    elif i == 8:
-                        self.image_points[1] = np.array([x, y], dtype='double')
-                        cv2.circle(frame, (x, y), 2, (0, 255, 0), -1)
-                    elif i == 36:
-                        self.image_points[2] = np.array([x, y], dtype='double')
-                        cv2.circle(frame, (x, y), 2, (0, 255, 0), -1)
-                    elif i == 45:
-                        self.image_points[3] = np.array([x, y], dtype='double')
-                        cv2.circle(frame, (x, y), 2, (0, 255, 0), -1)
-                    elif i == 48:
-                        self.image_points[4] = np.array([x, y], dtype='double')
-                        cv2.circle(frame, (x, y), 2, (0, 255, 0), -1)
-                    elif i == 54:
-                        self.image_points[5] = np.array([x, y], dtype='double')
-                        cv2.circle(frame, (x, y), 2, (0, 255, 0), -1)
-                
-                for p in self.image_points:
-                    cv2.circle(frame, (int(p[0]), int(p[1])), 3, (0, 0, 255), -1)
-                
-                (head_tilt_degree, start_point, end_point, 
-                    end_point_alt) = getHeadTiltAndCoords(size, self.image_points, frame_height)
-                
-                cv2.line(frame, start_point, end_point, (255, 0, 0), 2)
-                cv2.line(frame, start_point, end_point_alt, (0, 0, 255), 2)
-                
-                if head_tilt_degree:
-                    cv2.putText(frame, f"{tilt_text} {head_tilt_degree[0]:.1f}°", (10, 50),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
-            
-            # Update video display in GUI
-            self.root.after(0, self.update_video_display, frame)
+            # Report analysis speed and pipeline state every 30 frames
+            frame_count += 1
+            if frame_count % 30 == 0:
+                tracker = analyzer.tracker
+                status = (f"{self.t('running')} {analyzer.fps:.1f} fps "
+                          f"(display {self.display_fps:.1f} fps), detection {tracker.detection_rate * 100:.0f}% "
+                          f"({tracker.mean_detect_ms:.0f} ms)")
+                if tracker.roi_margin is not None:
+                    status += f", ROI {tracker.roi_hit_rate * 100:.0f}%"
+                if quality is not None:
+                    status += f", quality {quality.level} ({quality.name})"
+                if result.faces and result.faces[0].metrics is not None:
+                    metrics = result.faces[0].metrics
+                    status += (f", PERCLOS {metrics.perclos * 100:.0f}%"
+                               f", blinks {metrics.blinks_per_min:.0f}/min"
+                               f", yawns {metrics.yawns.sum}, nods {metrics.nods.sum}")
+                status += (f", queue {capture_queue.depth}"
+                           f", dropped {capture_queue.dropped}"
+                           f", latency {self.latency_ms:.0f} ms")
+                self.root.after(0, lambda s=status: self.status_var.set(s))
             
-            # Small delay to prevent GUI freezing
-            time.sleep(0.01)
-        
-        # Cleanup
-        if self.source_type == 'camera' and self.vs:
-            self.vs.stop()
-        elif self.vs:
-            self.vs.release()
-        
-        # Release export writer
-        if self.export_writer is not None:
-            self.export_writer.release()
-            self.export_writer = None
+            # Hand over to the display stage
+            display_queue.put(packet)
+        
+        # Cleanup, the display stage finishes once it has drained its queue
+        capture.stop()
+        capture_queue.close()
+        capture.join(timeout=1.0)
+        self.vs.release()
+        analyzer.close()
+        display_queue.close()
+        
+        # Finish the export file
+        if writer is not None:
+            try:
+                stats = writer.close()
+            except IOError as e:
+                print(f"[ERROR] {e}")
+                self.root.after(0, lambda m=str(e): messagebox.showerror(self.t('export_error'), m))
+                return
             self.root.after(0, lambda: messagebox.showinfo(
                 self.t('export_title'), 
-                f"{self.t('export_success')}\nFile: {self.export_path}"
+                f"{self.t('export_success')}\nFile: {self.export_path}\n"
+                f"{stats['backend']}: {stats['fps']:.1f} fps"
             ))
+    
+    def poll_display(self, queue):
+        """Display stage of the live pipeline, runs on the Tk thread"""
+        if not self.is_running:
+            queue.clear()
+        
+        # Only the newest analyzed frame is shown, older ones were dropped
+        packet = queue.get_latest()
+        if packet is not None:
+            self.current_frame_pos = packet.index + 1
+            self.update_video_display(packet.frame)
+            now = time.perf_counter()
+            latency = (now - packet.capture_time) * 1000
+            self.latency_ms = latency if self.latency_ms == 0 else \
+                0.9 * self.latency_ms + 0.1 * latency
+            if self.last_display_time is not None:
+                fps = 1.0 / max(now - self.last_display_time, 1e-6)
+                self.display_fps = fps if self.display_fps == 0 else \
+                    0.9 * self.display_fps + 0.1 * fps
+            self.last_display_time = now
+        
+        if queue.closed and queue.depth == 0:
+            self.finish_detection(queue)
+            return
+        self.root.after(DISPLAY_POLL_MS, self.poll_display, queue)
+    
+    def finish_detection(self, queue):
+        """Called by the display stage once the pipeline has stopped"""
+        if queue is not self.display_queue:
+            return  # a newer run has already taken over
+        self.capture = None
         
         # Reset UI
-        self.root.after(0, self.stop_detection)
-        self.root.after(0, lambda: self.status_var.set("Detection completed"))
+        self.stop_detection()
+        self.status_var.set("Detection completed")
 
 
 def main():
     root = tk.Tk()
     app = DrowsinessDetectorGUI(root)
+    root.protocol("WM_DELETE_WINDOW", app.on_close)
     root.mainloop()
 
 
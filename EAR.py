@@ -1,14 +1,35 @@
-from scipy.spatial import distance as dist
+import numpy as np
+
+# indexes in the 68 point model of the points compared by the EAR,
+# (vertical pair 1, vertical pair 2, horizontal pair) for the left and
+# the right eye
+EYES_A = [[43, 44, 42], [37, 38, 36]]
+EYES_B = [[47, 46, 45], [41, 40, 39]]
+
+
+def _ratio(a, b):
+    # euclidean distances between the point pairs along the last axis,
+    # two vertical distances over twice the horizontal one
+    d = np.sqrt(((a - b) ** 2).sum(axis=-1))
+    return (d[..., 0] + d[..., 1]) / (2.0 * d[..., 2])
+
 
 def eye_aspect_ratio(eye):
-    # compute the euclidean distances between the two sets of
-    # vertical eye landmarks (x, y)-coordinates
-    A = dist.euclidean(eye[1], eye[5])
-    B = dist.euclidean(eye[2], eye[4])
-    # compute the euclidean distance between the horizontal
-    # eye landmark (x, y)-coordinates
-    C = dist.euclidean(eye[0], eye[3])
-    # compute the eye aspect ratio
-    ear = (A + B) / (2.0 * C)
-    # return the eye aspect ratio
-    return ear
\ No newline at end of file
+    # eye is the (6, 2) array of one eye's (x, y)-coordinates, or a
+    # (N, 6, 2) batch of them
+    eye = np.asarray(eye, dtype=np.float64)
+    # compare the two sets of vertical eye landmarks and the
+    # horizontal eye landmarks
+    return _ratio(eye[..., [1, 2, 0], :], eye[..., [5, 4, 3], :])
+
+
+def eye_aspect_ratios(landmarks):
+    # landmarks is a (68, 2) array of facial landmarks or a (N, 68, 2)
+    # batch of them; returns the left, right and mean eye aspect ratio,
+    # as floats for a single face and as (N,) arrays for a batch
+    landmarks = np.asarray(landmarks)
+    ears = _ratio(landmarks[..., EYES_A, :].astype(np.float64),
+                  landmarks[..., EYES_B, :].astype(np.float64))
+    left = ears[..., 0]
+    right = ears[..., 1]
+    return left, right, (left + right) / 2.0
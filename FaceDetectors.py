@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+"""
+Face detector backends
+Every backend is called like dlib's detector, detector(image, upsample),
+and returns dlib rectangles, so detect_faces and FaceTracker work with any
+of them. A backend is named by a spec, given in the analyzer options, on
+the command line or in the DROWSINESS_DETECTOR environment variable:
+    hog                 dlib's HOG detector (the default)
+    haar[:cascade]      an OpenCV Haar cascade, by default frontalface_default
+    path/to/model       a local model file: dlib MMOD (.dat), OpenCV YuNet
+                        (.onnx) or an OpenCV DNN SSD (.caffemodel or .pb,
+                        with its .prototxt or .pbtxt next to it or given
+                        after a comma)
+"""
+import os
+import cv2
+import dlib
+
+DETECTOR_ENV = 'DROWSINESS_DETECTOR'
+DEFAULT_DETECTOR = 'hog'
+
+HAAR_CASCADE = 'haarcascade_frontalface_default.xml'
+
+# Network configurations looked for next to an SSD model: the model's
+# name with another extension, then files of a fixed name in its directory
+SSD_CONFIGS = {'.caffemodel': ('.prototxt',), '.pb': ('.pbtxt',)}
+SSD_DEFAULT_CONFIGS = {'.caffemodel': ('deploy.prototxt',), '.pb': ()}
+
+
+def detector_spec(spec=None):
+    """spec, else the one in DROWSINESS_DETECTOR, else DEFAULT_DETECTOR"""
+    return spec or os.environ.get(DETECTOR_ENV) or DEFAULT_DETECTOR
+
+
+def detector_name(spec):
+    """Short name of a spec, without the directories of a model path"""
+    if spec in ('hog', 'haar') or spec.startswith('haar:'):
+        return spec
+    return ','.join(os.path.basename(part) for part in spec.split(','))
+
+
+def _upsample(image, upsample):
+    """image enlarged upsample times by 2 and the enlargement factor"""
+    factor = 2 ** upsample
+    if upsample:
+        image = cv2.resize(image, None, fx=factor, fy=factor, interpolation=cv2.INTER_LINEAR)
+    return image, factor
+
+
+def _bgr(image):
+    return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR) if image.ndim == 2 else image
+
+
+def _rectangle(x, y, w, h, factor=1):
+    """dlib rectangle of the (x, y, w, h) box found on an image enlarged by factor"""
+    return dlib.rectangle(int(x / factor), int(y / factor),
+                          int((x + w) / factor) - 1, int((y + h) / factor) - 1)
+
+
+class HaarDetector:
+    """OpenCV Haar cascade, cascade is a file name in cv2.data.haarcascades or a path"""
+    def __init__(self, cascade=HAAR_CASCADE, scale_factor=1.1, min_neighbors=5, min_size=(80, 80)):
+        path = cascade if os.path.exists(cascade) else os.path.join(cv2.data.haarcascades, cascade)
+        self.classifier = cv2.CascadeClassifier(path)
+        if self.classifier.empty():
+            raise IOError(f"Could not load Haar cascade {cascade}")
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+
+    def __call__(self, image, upsample=0):
+        if image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        (image, factor) = _upsample(image, upsample)
+        boxes = self.classifier.detectMultiScale(image, self.scale_factor, self.min_neighbors,
+                                                 minSize=self.min_size)
+        return [_rectangle(x, y, w, h, factor) for (x, y, w, h) in boxes]
+
+
+class MMODDetector:
+    """dlib CNN (MMOD) face detector from a .dat model file"""
+    def __init__(self, path):
+        self.net = dlib.cnn_face_detection_model_v1(path)
+
+    def __call__(self, image, upsample=0):
+        if image.ndim == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
+        return [d.rect for d in self.net(image, upsample)]
+
+
+class YuNetDetector:
+    """OpenCV YuNet face detector from an .onnx model file"""
+    def __init__(self, path, score_threshold=0.6):
+        self.net = cv2.FaceDetectorYN.create(path, "", (320, 320), score_threshold)
+
+    def __call__(self, image, upsample=0):
+        (image, factor) = _upsample(_bgr(image), upsample)
+        self.net.setInputSize((image.shape[1], image.shape[0]))
+        (_, faces) = self.net.detect(image)
+        if faces is None:
+            return []
+        return [_rectangle(*face[:4], factor) for face in faces]
+
+
+class SSDDetector:
+    """OpenCV DNN single-shot face detector, like the res10 300x300 Caffe model"""
+    def __init__(self, path, config, confidence=0.5, input_size=(300, 300),
+                 mean=(104.0, 177.0, 123.0)):
+        self.net = cv2.dnn.readNet(path, config)
+        self.confidence = confidence
+        self.input_size = input_size
+        self.mean = mean
+
+    def __call__(self, image, upsample=0):
+        # The network sees a fixed input size, upsampling does not help it
+        image = _bgr(image)
+        (h, w) = image.shape[:2]
+        self.net.setInput(cv2.dnn.blobFromImage(image, 1.0, self.input_size, self.mean))
+        detections = self.net.forward().reshape(-1, 7)
+        rects = []
+        for (_, _, confidence, x0, y0, x1, y1) in detections:
+            if confidence >= self.confidence:
+                rects.append(dlib.rectangle(int(x0 * w), int(y0 * h), int(x1 * w) - 1, int(y1 * h) - 1))
+        return rects
+
+
+def _ssd_config(path):
+    (stem, extension) = os.path.splitext(path)
+    extension = extension.lower()
+    candidates = [stem + suffix for suffix in SSD_CONFIGS.get(extension, ())]
+    candidates += [os.path.join(os.path.dirname(path), name)
+                   for name in SSD_DEFAULT_CONFIGS.get(extension, ())]
+    for candidate in candidates:
+        if os.path.exists(candidate):
+            return candidate
+    raise IOError(f"No network configuration found next to {path}, give it as {path},<config>")
+
+
+def create_detector(spec=None):
+    """New detector for spec (see the module docstring)
+
+    Detectors must not be shared between threads; ModelRegistry.get_detector
+    keeps one per thread.
+    """
+    spec = detector_spec(spec)
+    if spec == 'hog':
+        return dlib.get_frontal_face_detector()
+    if spec == 'haar':
+        return HaarDetector()
+    if spec.startswith('haar:'):
+        return HaarDetector(spec[len('haar:'):])
+
+    (path, _, config) = spec.partition(',')
+    if not os.path.exists(path):
+        raise IOError(f"Face detector model {path} not found")
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.dat':
+        return MMODDetector(path)
+    if extension == '.onnx':
+        return YuNetDetector(path)
+    if extension in SSD_CONFIGS:
+        return SSDDetector(path, config or _ssd_config(path))
+    raise ValueError(f"Unknown face detector {spec!r}, expected hog, haar[:cascade] "
+                     f"or a .dat, .onnx, .caffemodel or .pb model file")
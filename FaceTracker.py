@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+"""
+Detect-then-track face localization
+Runs the face detector only every few frames and follows the faces in
+between, either with dlib's correlation tracker or by moving the last
+detected box along with the face landmarks. Detections can be limited to
+a window around the last known face position
+"""
+import time
+import dlib
+import numpy as np
+
+
+class FaceTracker:
+    """Finds the face rectangles of each frame for the landmark predictor
+
+    detect is the full-frame face detector, called as detect(image).
+    detect_interval is the number of frames between two full detections,
+    1 runs the detector on every frame. Between detections the faces are
+    followed with method 'correlation' (dlib.correlation_tracker) or
+    'landmarks' (the detected box follows the centroid of the landmarks
+    predicted on the previous frame). A full detection is also run when
+    no face is being tracked, when a correlation tracker's confidence
+    drops below redetect_confidence, or when a tracked box leaves the frame.
+    Given the frame number, the scheduled detections run on the frames
+    whose number is a multiple of detect_interval, whatever happened
+    before, so two passes over a video detect on the same frames from the
+    first such frame after either started.
+
+    With roi_margin set, detections search only a window around the last
+    known faces, grown by roi_margin times the face size on every side.
+    The whole frame is scanned again once the window search has failed on
+    roi_fallback consecutive frames.
+    """
+    METHODS = ('correlation', 'landmarks')
+
+    def __init__(self, detect, detect_interval=1, method='correlation',
+                 redetect_confidence=7.0, roi_margin=None, roi_fallback=3):
+        if method not in self.METHODS:
+            raise ValueError(f"Unknown tracking method: {method}")
+        self.detect = detect
+        self.detect_interval = max(1, int(detect_interval))
+        self.method = method
+        self.redetect_confidence = redetect_confidence
+        self.roi_margin = roi_margin
+        self.roi_fallback = max(1, int(roi_fallback))
+
+        self.frames_since_detect = 0
+        self.last_rects = []     # last non-empty set of face rectangles
+        self.roi_misses = 0      # consecutive failed window searches
+        self.rects = []          # rectangles returned for the last frame
+        self.trackers = []       # correlation trackers, one per face
+        self.detected = []       # rectangles of the last full detection
+        self.anchors = []        # landmark centroid at detection, one per face
+        self.offsets = []        # landmark centroid movement since detection
+
+        # Statistics
+        self.frames = 0
+        self.detections = 0
+        self.roi_attempts = 0
+        self.roi_hits = 0
+        self.detect_ms = 0.0     # time of the last detection
+        self.mean_detect_ms = 0.0
+
+    def reset(self):
+        """Forget the tracked faces, the next frame runs a full detection"""
+        self.rects = []
+        self.trackers = []
+        self.detected = []
+        self.anchors = []
+        self.offsets = []
+        self.frames_since_detect = 0
+        self.last_rects = []
+        self.roi_misses = 0
+
+    def locate(self, image, frame_number=None):
+        """Return the face rectangles for image, frame frame_number of its source"""
+        self.frames += 1
+
+        if frame_number is None:
+            due = self.frames_since_detect >= self.detect_interval
+        else:
+            due = frame_number % self.detect_interval == 0
+        if self.detect_interval > 1 and self.rects and not due:
+            rects = self._track(image)
+            if rects is not None:
+                self.frames_since_detect += 1
+                self.rects = rects
+                self.last_rects = rects
+                return rects
+
+        return self._detect(image)
+
+    def update_landmarks(self, index, shape):
+        """Report the landmarks predicted inside rectangle index of the last frame"""
+        if self.method != 'landmarks' or index >= len(self.anchors):
+            return
+        (cx, cy) = shape.mean(axis=0)
+        if self.anchors[index] is None:
+            self.anchors[index] = (cx, cy)
+        (ax, ay) = self.anchors[index]
+        self.offsets[index] = (cx - ax, cy - ay)
+
+    @property
+    def detection_rate(self):
+        """Fraction of frames that ran the detector"""
+        return self.detections / self.frames if self.frames else 0.0
+
+    @property
+    def roi_hit_rate(self):
+        """Fraction of window searches that found a face"""
+        return self.roi_hits / self.roi_attempts if self.roi_attempts else 0.0
+
+    def roi(self, shape):
+        """Search window (left, top, right, bottom) around the last faces, or None"""
+        if self.roi_margin is None or not self.last_rects:
+            return None
+        (h, w) = shape[:2]
+        left = min(r.left() for r in self.last_rects)
+        top = min(r.top() for r in self.last_rects)
+        right = max(r.right() for r in self.last_rects)
+        bottom = max(r.bottom() for r in self.last_rects)
+        mx = int((right - left) * self.roi_margin)
+        my = int((bottom - top) * self.roi_margin)
+        return (max(0, left - mx), max(0, top - my), min(w, right + mx), min(h, bottom + my))
+
+    def _detect(self, image):
+        start = time.perf_counter()
+        rects = None
+
+        roi = self.roi(image.shape)
+        if roi is not None:
+            (x0, y0, x1, y1) = roi
+            window = np.ascontiguousarray(image[y0:y1, x0:x1])
+            rects = [dlib.rectangle(r.left() + x0, r.top() + y0, r.right() + x0, r.bottom() + y0)
+                     for r in self.detect(window)]
+            self.roi_attempts += 1
+            if rects:
+                self.roi_hits += 1
+                self.roi_misses = 0
+            else:
+                self.roi_misses += 1
+                if self.roi_misses >= self.roi_fallback:
+                    rects = None
+
+        if rects is None:
+            # Full-frame scan
+            rects = list(self.detect(image))
+            self.roi_misses = 0
+            self.last_rects = []
+
+        if rects:
+            self.last_rects = rects
+
+        self.detect_ms = (time.perf_counter() - start) * 1000
+        if self.detections == 0:
+            self.mean_detect_ms = self.detect_ms
+        else:
+            self.mean_detect_ms = 0.9 * self.mean_detect_ms + 0.1 * self.detect_ms
+        self.detections += 1
+        self.frames_since_detect = 1
+        self.rects = rects
+
+        if self.method == 'correlation':
+            self.trackers = []
+            for rect in rects:
+                tracker = dlib.correlation_tracker()
+                tracker.start_track(image, rect)
+                self.trackers.append(tracker)
+        else:
+            self.anchors = [None] * len(rects)
+            self.offsets = [(0, 0)] * len(rects)
+            self.detected = rects
+
+        return rects
+
+    def _track(self, image):
+        """Tracked rectangles, or None if a full detection is needed"""
+        (h, w) = image.shape[:2]
+        rects = []
+
+        if self.method == 'correlation':
+            for tracker in self.trackers:
+                if tracker.update(image) < self.redetect_confidence:
+                    return None
+                pos = tracker.get_position()
+                rects.append(dlib.rectangle(int(pos.left()), int(pos.top()),
+                                            int(pos.right()), int(pos.bottom())))
+        else:
+            for rect, (dx, dy) in zip(self.detected, self.offsets):
+                rects.append(dlib.rectangle(int(rect.left() + dx), int(rect.top() + dy),
+                                            int(rect.right() + dx), int(rect.bottom() + dy)))
+
+        for rect in rects:
+            # The face left the frame, look for it again
+            if rect.right() < 0 or rect.bottom() < 0 or rect.left() >= w or rect.top() >= h:
+                return None
+
+        return rects
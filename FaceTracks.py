@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+"""
+Per-face tracks
+Matches the faces of each frame to the faces of the previous frames by
+overlap, so every person keeps a stable ID, a closed-eyes counter and a
+warm-started head pose estimator of their own
+"""
+import dlib
+import numpy as np
+from HeadPose import HeadPoseEstimator
+
+
+def rect_array(rects):
+    """(n, 4) float array of left, top, right, bottom"""
+    if not rects:
+        return np.zeros((0, 4))
+    return np.array([(r.left(), r.top(), r.right(), r.bottom()) for r in rects], dtype=float)
+
+
+def iou_matrix(a, b):
+    """Intersection over union of every box in a with every box in b, both (n, 4)"""
+    left = np.maximum(a[:, None, 0], b[None, :, 0])
+    top = np.maximum(a[:, None, 1], b[None, :, 1])
+    right = np.minimum(a[:, None, 2], b[None, :, 2])
+    bottom = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(right - left, 0, None) * np.clip(bottom - top, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+
+def match(a, b, threshold):
+    """Greedy one-to-one matching of boxes a to boxes b by IoU
+
+    Returns {index in a: index in b} for the pairs overlapping at least
+    threshold, best overlaps first.
+    """
+    if len(a) == 0 or len(b) == 0:
+        return {}
+    ious = iou_matrix(a, b)
+    pairs = {}
+    used = set()
+    for flat in np.argsort(-ious, axis=None):
+        (i, j) = divmod(int(flat), ious.shape[1])
+        if ious[i, j] < threshold:
+            break
+        if i in pairs or j in used:
+            continue
+        pairs[i] = j
+        used.add(j)
+    return pairs
+
+
+class Track:
+    """State of one face followed across frames"""
+    def __init__(self, track_id, rect, pose_solver='iterative', metrics=None):
+        self.id = track_id
+        self.rect = rect                  # dlib.rectangle in the last frame it was seen
+        self.counter = 0                  # consecutive frames with closed eyes
+        self.pose_estimator = HeadPoseEstimator(pose_solver)
+        self.pose = None                  # last HeadPose
+        self.missed = 0                   # consecutive frames without a match
+        self.age = 0                      # frames the track was seen in
+        self.metrics = metrics            # FatigueMetrics, or None
+
+
+class TrackManager:
+    """Keeps the tracks of the faces in view
+
+    update() assigns every face rectangle of a frame to the track it
+    overlaps most (at least iou_threshold), starting new tracks for the
+    others. Tracks survive max_missed frames without a face, so a missed
+    detection or a hand in front of the face does not reset the counters.
+    metrics_factory, if set, is called without arguments to give every new
+    track its FatigueMetrics.
+    """
+    def __init__(self, iou_threshold=0.3, max_missed=15, pose_solver='iterative',
+                 metrics_factory=None):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.pose_solver = pose_solver
+        self.metrics_factory = metrics_factory
+        self.tracks = []
+        self.next_id = 1
+
+    def new_track(self, track_id, rect):
+        metrics = self.metrics_factory() if self.metrics_factory is not None else None
+        return Track(track_id, rect, self.pose_solver, metrics)
+
+    def reset(self):
+        self.tracks = []
+        self.next_id = 1
+
+    def update(self, rects):
+        """Tracks of rects, in the same order
+
+        Tracks kept without a face in this frame are left in self.tracks
+        with missed > 0.
+        """
+        pairs = match(rect_array(rects), rect_array([t.rect for t in self.tracks]),
+                      self.iou_threshold)
+
+        result = []
+        for i, rect in enumerate(rects):
+            if i in pairs:
+                track = self.tracks[pairs[i]]
+            else:
+                track = self.new_track(self.next_id, rect)
+                self.next_id += 1
+            track.rect = rect
+            track.missed = 0
+            track.age += 1
+            result.append(track)
+
+        matched = set(pairs.values())
+        kept = []
+        for j, track in enumerate(self.tracks):
+            if j not in matched:
+                track.missed += 1
+                # Stale once the face is lost: not reused on frames that
+                # skip the pose, nor as the solver's starting point when
+                # the face comes back
+                track.pose = None
+                track.pose_estimator.reset()
+            if track.missed <= self.max_missed:
+                kept.append(track)
+        self.tracks = kept + [t for t in result if t not in kept]
+        return result
+
+    def get_state(self):
+        """Counters, positions and head pose warm starts of the tracks as plain data"""
+        state = []
+        for t in self.tracks:
+            estimator = t.pose_estimator
+            pose = None
+            if estimator.rotation_vector is not None:
+                pose = [estimator.rotation_vector.ravel().tolist(),
+                        estimator.translation_vector.ravel().tolist()]
+            state.append({'id': t.id,
+                          'rect': (t.rect.left(), t.rect.top(), t.rect.right(), t.rect.bottom()),
+                          'counter': t.counter,
+                          'missed': t.missed,
+                          'pose': pose})
+        return state
+
+    def set_state(self, state):
+        """Restore tracks from get_state(), fatigue metrics start cold"""
+        self.tracks = []
+        for item in state:
+            track = self.new_track(item['id'], dlib.rectangle(*item['rect']))
+            track.counter = item['counter']
+            track.missed = item['missed']
+            if item.get('pose') is not None:
+                (rotation, translation) = item['pose']
+                track.pose_estimator.rotation_vector = np.array(rotation).reshape(3, 1)
+                track.pose_estimator.translation_vector = np.array(translation).reshape(3, 1)
+            self.tracks.append(track)
+        self.next_id = max([t.id for t in self.tracks], default=0) + 1
+
+
+def states_match(a, b, counter_cap, iou_threshold=0.5):
+    """True if two get_state() results lead to the same alerts from now on
+
+    Track IDs are ignored. The tracks must pair up by position and agree on
+    their missed frames and on their counters up to counter_cap, the value
+    from which a counter no longer changes what gets flagged.
+    """
+    if len(a) != len(b):
+        return False
+    pairs = match(np.array([t['rect'] for t in a], dtype=float).reshape(-1, 4),
+                  np.array([t['rect'] for t in b], dtype=float).reshape(-1, 4),
+                  iou_threshold)
+    if len(pairs) != len(a):
+        return False
+    return all(min(a[i]['counter'], counter_cap) == min(b[j]['counter'], counter_cap) and
+               a[i]['missed'] == b[j]['missed']
+               for i, j in pairs.items())
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+"""
+Streaming fatigue metrics
+PERCLOS, blinks, long eye closures, yawns and head nods over a sliding
+window, updated from the EAR, MAR and head pitch of every frame. All
+windows are fixed-size ring buffers with running sums, so every update
+costs the same and memory does not grow however long the session runs
+"""
+
+
+class RingSum:
+    """Integer values of the last size frames and their sum
+
+    A plain list, element access on it is several times faster than on a
+    numpy array and the sum stays exact however many values go through.
+    """
+    def __init__(self, size):
+        self.values = [0] * size
+        self.size = size
+        self.index = 0
+        self.count = 0
+        self.sum = 0
+
+    def push(self, value):
+        index = self.index
+        self.sum += value - self.values[index]
+        self.values[index] = value
+        self.index = index + 1 if index + 1 < self.size else 0
+        if self.count < self.size:
+            self.count += 1
+
+
+class FatigueMetrics:
+    """Fatigue indicators of one face
+
+    Call update() once per frame with the face's EAR, MAR and head pitch,
+    or with None values on frames where the face was not found. fps
+    converts frames to time. A run of closed-eye frames (EAR below
+    ear_thresh) up to max_blink_s long is a blink, a longer one a long
+    closure; a run of MAR above mar_thresh of at least min_yawn_s is a
+    yawn. A nod is the head pitch leaving its slowly-followed baseline by
+    more than nod_degrees and coming back within max_nod_s.
+    """
+    def __init__(self, fps=30.0, window_s=60.0, ear_thresh=0.25, mar_thresh=0.79,
+                 max_blink_s=0.5, min_yawn_s=1.0, nod_degrees=15.0, max_nod_s=2.0):
+        self.fps = fps
+        self.window_s = window_s
+        self.ear_thresh = ear_thresh
+        self.mar_thresh = mar_thresh
+        self.max_blink_frames = max(1, int(round(max_blink_s * fps)))
+        self.min_yawn_frames = max(1, int(round(min_yawn_s * fps)))
+        self.nod_degrees = nod_degrees
+        self.max_nod_frames = max(1, int(round(max_nod_s * fps)))
+
+        size = max(1, int(round(window_s * fps)))
+        self.observed = RingSum(size)       # 1 on frames with the face
+        self.closed = RingSum(size)         # 1 on frames with closed eyes
+        self.blinks = RingSum(size)         # 1 on the frame a blink ended
+        self.blink_frames = RingSum(size)   # blink length, on the frame it ended
+        self.long_closures = RingSum(size)
+        self.yawns = RingSum(size)
+        self.nods = RingSum(size)
+
+        # Runs in progress
+        self.closed_run = 0
+        self.yawn_run = 0
+        self.nod_run = 0
+        self.pitch_baseline = None
+
+        # Session totals
+        self.frames = 0
+        self.total_blinks = 0
+        self.total_long_closures = 0
+        self.total_yawns = 0
+        self.total_nods = 0
+
+    def update(self, ear, mar, pitch=None):
+        """Add one frame; ear and mar are None when the face was not found"""
+        self.frames += 1
+        seen = ear is not None
+        closed = seen and ear < self.ear_thresh
+        yawning = seen and mar is not None and mar > self.mar_thresh
+
+        blink = long_closure = blink_frames = 0
+        if closed:
+            self.closed_run += 1
+        elif self.closed_run:
+            # A closed run ends when the eyes open or the face is lost
+            if self.closed_run <= self.max_blink_frames:
+                blink = 1
+                blink_frames = self.closed_run
+            else:
+                long_closure = 1
+            self.closed_run = 0
+
+        yawn = 0
+        if yawning:
+            self.yawn_run += 1
+            if self.yawn_run == self.min_yawn_frames:
+                yawn = 1
+        else:
+            self.yawn_run = 0
+
+        nod = 0
+        if pitch is not None:
+            if self.pitch_baseline is None:
+                self.pitch_baseline = pitch
+            deviation = abs(pitch - self.pitch_baseline)
+            if self.nod_run:
+                self.nod_run += 1
+                if deviation < self.nod_degrees / 2:
+                    nod = 1
+                    self.nod_run = 0
+                elif self.nod_run > self.max_nod_frames:
+                    # Held too long for a nod, the head settled in a new position
+                    self.pitch_baseline = pitch
+                    self.nod_run = 0
+            elif deviation > self.nod_degrees:
+                self.nod_run = 1
+            else:
+                self.pitch_baseline += 0.01 * (pitch - self.pitch_baseline)
+
+        self.observed.push(int(seen))
+        self.closed.push(int(closed))
+        self.blinks.push(blink)
+        self.blink_frames.push(blink_frames)
+        self.long_closures.push(long_closure)
+        self.yawns.push(yawn)
+        self.nods.push(nod)
+
+        self.total_blinks += blink
+        self.total_long_closures += long_closure
+        self.total_yawns += yawn
+        self.total_nods += nod
+
+    @property
+    def perclos(self):
+        """Fraction of the observed frames in the window with closed eyes"""
+        return self.closed.sum / self.observed.sum if self.observed.sum else 0.0
+
+    def per_minute(self, events):
+        """Rate of the events in a window ring per minute of the window"""
+        minutes = self.observed.count / self.fps / 60.0
+        return events.sum / minutes if minutes else 0.0
+
+    @property
+    def blinks_per_min(self):
+        return self.per_minute(self.blinks)
+
+    @property
+    def yawns_per_min(self):
+        return self.per_minute(self.yawns)
+
+    def snapshot(self):
+        """Current window values and session totals as a dict"""
+        return {
+            'perclos': round(self.perclos, 4),
+            'blinks_per_min': round(self.blinks_per_min, 2),
+            'mean_blink_ms': round(self.blink_frames.sum / self.blinks.sum / self.fps * 1000, 1)
+            if self.blinks.sum else 0.0,
+            'long_closures': self.long_closures.sum,
+            'yawns_per_min': round(self.yawns_per_min, 2),
+            'nods': self.nods.sum,
+            'window_s': round(self.observed.count / self.fps, 1),
+            'total_frames': self.frames,
+            'total_blinks': self.total_blinks,
+            'total_long_closures': self.total_long_closures,
+            'total_yawns': self.total_yawns,
+            'total_nods': self.total_nods,
+        }
@@ -0,0 +1,348 @@
+#!/usr/bin/env python
+"""
+Frame analysis engine shared by the GUI, the exporter and the console script
+A BGR frame goes in, the detected faces with their EAR, MAR and head pose come out.
+Nothing is drawn here, see Overlay for that
+"""
+import os
+import time
+import cv2
+import dlib
+import numpy as np
+from imutils import face_utils
+from EAR import eye_aspect_ratios
+from MAR import mouth_aspect_ratios
+from FaceTracker import FaceTracker
+from FaceTracks import TrackManager
+from FatigueMetrics import FatigueMetrics
+from LandmarkPool import LandmarkPool
+import ModelRegistry
+from ModelRegistry import PREDICTOR_PATH
+from FaceDetectors import detector_spec, detector_name
+
+
+# Thresholds
+EYE_AR_THRESH = 0.25
+MOUTH_AR_THRESH = 0.79
+EYE_AR_CONSEC_FRAMES = 3
+
+# Landmarks used for head pose, in the order of HeadPose.model_points:
+# nose tip 34, chin 9, left eye left corner 37, right eye right corner 46,
+# left mouth corner 49, right mouth corner 55
+POSE_LANDMARKS = [33, 8, 36, 45, 48, 54]
+
+def detect_faces(detector, image, scale=1.0, upsample=0):
+    """Run detector on image shrunk by scale and map the rectangles back
+
+    detector is any FaceDetectors backend. A driver's face is large in the
+    frame, so the HOG detector finds it on a 2x-4x smaller image at a
+    fraction of the cost. The HOG detector's smallest face is about 80x80
+    pixels, so with scale s faces must be about 80*s pixels wide; each
+    upsample step halves that again. Scales up to 1.0 detect on image as it
+    is.
+    """
+    if scale > 1.0:
+        small = cv2.resize(image, None, fx=1.0 / scale, fy=1.0 / scale,
+                           interpolation=cv2.INTER_AREA)
+    else:
+        small = image
+    rects = detector(small, upsample)
+    if small is image:
+        return list(rects)
+    return [dlib.rectangle(int(r.left() * scale), int(r.top() * scale),
+                           int(r.right() * scale), int(r.bottom() * scale))
+            for r in rects]
+
+
+class FaceResult:
+    """Analysis of a single face in a frame"""
+    def __init__(self, rect, shape, ear, mar, eyes_closed, yawning,
+                 image_points, pose, track_id=None, metrics=None):
+        self.track_id = track_id          # stable ID of the person across frames
+        self.metrics = metrics            # the track's FatigueMetrics, or None
+        self.rect = rect                  # dlib.rectangle
+        self.shape = shape                # (68, 2) landmark array
+        self.ear = ear                    # mean eye aspect ratio
+        self.mar = mar                    # mouth aspect ratio
+        self.eyes_closed = eyes_closed    # EAR below threshold for enough frames
+        self.yawning = yawning            # MAR above threshold
+        self.image_points = image_points  # (6, 2) points used for head pose
+        self.pose = pose                  # HeadPose with yaw, pitch and roll
+        self.head_tilt = pose.head_tilt   # head tilt in degrees
+        self.pose_lines = (pose.starting_point, pose.ending_point,
+                           pose.ending_point_alternate)
+
+
+class FrameResult:
+    """Analysis of a full frame"""
+    def __init__(self, frame, faces):
+        self.frame = frame  # resized BGR frame the analysis was done on, undrawn
+        self.faces = faces  # list of FaceResult
+
+
+class FrameAnalyzer:
+    """Runs the drowsiness pipeline on one frame at a time
+
+    Keeps the tracked faces between calls, each with its own closed-eyes
+    counter and head pose (see FaceTracks), so a single analyzer must be
+    fed the frames of one source in order. Models default to the ones in
+    ModelRegistry, so analyzers are cheap to create; detector_backend
+    picks the FaceDetectors backend of the default detector. Faces are
+    detected on the grayscale frame shrunk by detect_scale with upsample
+    pyramid steps (see detect_faces), landmarks are always predicted on
+    the full-resolution grayscale frame. detect_interval, tracking,
+    redetect_confidence, roi_margin and roi_fallback configure the
+    FaceTracker, see there. pose_solver picks the HeadPoseEstimator solver;
+    with pose_every > 1 the head pose is estimated every pose_every frames
+    and reused in between. With landmark_workers > 1 the landmarks of
+    frames with several faces are predicted in parallel in a LandmarkPool;
+    call close() when done. With fatigue_fps set, every track keeps
+    FatigueMetrics over the last fatigue_window_s seconds, with fatigue_fps
+    the frame rate of the source. profiler, if set, is a Profiler that
+    receives the time of every analysis stage.
+    """
+    def __init__(self, detector=None, predictor=None, frame_size=(800, 600),
+                 detect_interval=1, tracking='correlation',
+                 redetect_confidence=7.0, detect_scale=1.0, upsample=0,
+                 roi_margin=None, roi_fallback=3, pose_solver='iterative',
+                 pose_every=1, landmark_workers=1, fatigue_fps=None,
+                 fatigue_window_s=60.0, detector_backend=None, profiler=None):
+        if detect_scale < 1.0:
+            raise ValueError(f"detect_scale must be at least 1.0, got {detect_scale}")
+        self.detector_backend = detector_spec(detector_backend)
+        if detector is None:
+            detector = ModelRegistry.get_detector(self.detector_backend)
+        if predictor is None:
+            predictor = ModelRegistry.get_predictor()
+        self.detector = detector
+        self.predictor = predictor
+        self.frame_size = frame_size      # (width, height), None keeps the input size
+        self.fatigue_fps = fatigue_fps
+        self.fatigue_window_s = fatigue_window_s
+        self.tracks = TrackManager(
+            pose_solver=pose_solver,
+            metrics_factory=self.new_metrics if fatigue_fps else None)
+        self.pose_every = max(1, int(pose_every))
+        self.frame_index = 0              # number of the next frame in its source
+        self.landmark_pool = LandmarkPool(landmark_workers) if landmark_workers > 1 else None
+        self.detect_scale = detect_scale
+        self.upsample = upsample
+        self.tracker = FaceTracker(self.detect, detect_interval, tracking,
+                                   redetect_confidence, roi_margin, roi_fallback)
+        self.fps = 0.0                    # smoothed analysis frames/second
+        self.profiler = profiler
+        self.gray = None                  # grayscale buffer reused across frames
+
+        self.EYE_AR_THRESH = EYE_AR_THRESH
+        self.MOUTH_AR_THRESH = MOUTH_AR_THRESH
+        self.EYE_AR_CONSEC_FRAMES = EYE_AR_CONSEC_FRAMES
+
+    def new_metrics(self):
+        return FatigueMetrics(self.fatigue_fps, self.fatigue_window_s,
+                              self.EYE_AR_THRESH, self.MOUTH_AR_THRESH)
+
+    def reset(self, frame_index=0):
+        """Reset the per-source state before analyzing a new source
+
+        Also after a seek, with frame_index the number of the next frame:
+        the tracked faces, their counters and their fatigue metrics all
+        start over, so nothing from before the jump is counted after it.
+        """
+        self.frame_index = frame_index
+        self.tracker.reset()
+        self.tracks.reset()
+
+    def close(self):
+        """Stop the landmark worker processes, if any"""
+        if self.landmark_pool is not None:
+            self.landmark_pool.close()
+            self.landmark_pool = None
+
+    def cache_settings(self):
+        """Settings that decide which faces and landmarks are found
+
+        Used to key the LandmarkCache; thresholds are left out so they can
+        change without invalidating cached landmarks.
+        """
+        tracker = self.tracker
+        return {
+            'frame_size': list(self.frame_size) if self.frame_size else None,
+            'detector': detector_name(self.detector_backend),
+            'detect_scale': self.detect_scale,
+            'upsample': self.upsample,
+            'detect_interval': tracker.detect_interval,
+            'tracking': tracker.method,
+            'redetect_confidence': tracker.redetect_confidence,
+            'roi_margin': tracker.roi_margin,
+            'roi_fallback': tracker.roi_fallback,
+            'detect_phase': 'frame_number',
+            'predictor': os.path.basename(PREDICTOR_PATH),
+            'predictor_image': 'gray',
+        }
+
+    def detect(self, gray):
+        """Full-frame face detection with the configured scale and upsampling"""
+        return detect_faces(self.detector, gray, self.detect_scale, self.upsample)
+
+    def prepare(self, frame):
+        """Normalize a decoded frame to a resized 8-bit BGR image
+
+        Frames already 8-bit BGR at frame_size are returned as they are,
+        without a copy. Returns None if the frame cannot be used.
+        """
+        if frame is None or frame.size == 0:
+            return None
+
+        # Ensure frame is in correct format
+        try:
+            if len(frame.shape) == 2:
+                frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+            elif len(frame.shape) == 3 and frame.shape[2] == 4:
+                frame = frame[:, :, :3]
+
+            if frame.dtype != np.uint8:
+                frame = cv2.normalize(frame, None, 0, 255, cv2.NORM_MINMAX, dtype=cv2.CV_8U)
+        except Exception as e:
+            print(f"[ERROR] Frame format conversion failed: {e}")
+            return None
+
+        if self.frame_size is not None and frame.shape[1::-1] != tuple(self.frame_size):
+            if self.profiler is not None:
+                t = time.perf_counter()
+            frame = cv2.resize(frame, self.frame_size)
+            if self.profiler is not None:
+                self.profiler.record('resize', t)
+
+        return frame
+
+    def grayscale(self, frame):
+        """frame in grayscale, in a buffer that is overwritten on the next call
+
+        The detector, the trackers and the predictor all work on this one
+        image; nothing of it is kept once the frame is analyzed.
+        """
+        (h, w) = frame.shape[:2]
+        if self.gray is None or self.gray.shape != (h, w):
+            self.gray = np.empty((h, w), dtype=np.uint8)
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self.gray)
+
+    def analyze(self, frame, cached=None):
+        """Analyze a decoded frame, returns a FrameResult or None
+
+        cached is an optional (rects, shapes) pair from a LandmarkCache; it
+        replaces face detection and landmark prediction for this frame.
+        """
+        start = time.perf_counter()
+        profiler = self.profiler
+        frame = self.prepare(frame)
+        if frame is None:
+            return None
+
+        size = frame.shape[:2]
+
+        if cached is not None:
+            (rects, shapes) = cached
+        else:
+            if profiler is not None:
+                t = time.perf_counter()
+            gray = self.grayscale(frame)
+            if profiler is not None:
+                profiler.record('color', t)
+                t = time.perf_counter()
+
+            # Detect or track faces on the grayscale frame
+            rects = self.tracker.locate(gray, self.frame_index)
+            if profiler is not None:
+                profiler.record('detect', t)
+                t = time.perf_counter()
+
+            if self.landmark_pool is not None and len(rects) > 1:
+                shapes = self.landmark_pool.predict(gray, rects)
+            else:
+                shapes = [face_utils.shape_to_np(self.predictor(gray, rect)) for rect in rects]
+            for index, shape in enumerate(shapes):
+                self.tracker.update_landmarks(index, shape)
+            if profiler is not None:
+                profiler.record('landmarks', t)
+
+        # Eye and mouth aspect ratios of all faces in one pass
+        if profiler is not None:
+            t = time.perf_counter()
+        landmarks = np.array(shapes).reshape(-1, 68, 2)
+        (_, _, ears) = eye_aspect_ratios(landmarks)
+        mars = mouth_aspect_ratios(landmarks)
+        if profiler is not None:
+            profiler.record('ear_mar', t)
+
+        faces = self.update_faces(size, rects, shapes, ears, mars)
+
+        elapsed = time.perf_counter() - start
+        if elapsed > 0:
+            self.fps = 1.0 / elapsed if self.fps == 0.0 else 0.9 * self.fps + 0.1 / elapsed
+
+        return FrameResult(frame, faces)
+
+    def analyze_cached(self, rects, shapes, ears, mars):
+        """Analyze a frame from its cached faces alone, without decoding it
+
+        ears and mars are the frame's rows of LandmarkCache.iter_metrics,
+        computed for a whole block of frames at once. Returns a FrameResult
+        without a frame; frame_size must be set, the landmarks were found
+        at that size.
+        """
+        (w, h) = self.frame_size
+        return FrameResult(None, self.update_faces((h, w), rects, shapes, ears, mars))
+
+    def update_faces(self, size, rects, shapes, ears, mars):
+        """FaceResults of a frame of size (height, width) from its faces
+
+        Feeds the faces to their tracks: closed-eyes counters, head pose and
+        fatigue metrics.
+        """
+        profiler = self.profiler
+        pose_ms = 0.0
+
+        # Every face continues the track of the same person
+        tracks = self.tracks.update(rects)
+        pose_frame = self.frame_index % self.pose_every == 0
+        self.frame_index += 1
+
+        faces = []
+        for rect, shape, ear, mar, track in zip(rects, shapes, ears, mars, tracks):
+            ear = float(ear)
+            mar = float(mar)
+
+            # Eye detection
+            if ear < self.EYE_AR_THRESH:
+                track.counter += 1
+            else:
+                track.counter = 0
+            eyes_closed = track.counter >= self.EYE_AR_CONSEC_FRAMES
+
+            # Head pose estimation, warm-started from the track's previous
+            # pose; frames that skip it reuse that pose
+            image_points = shape[POSE_LANDMARKS].astype(np.float64)
+            if pose_frame or track.pose is None:
+                if profiler is not None:
+                    t = time.perf_counter()
+                track.pose = track.pose_estimator.estimate(size, image_points)
+                if profiler is not None:
+                    pose_ms += (time.perf_counter() - t) * 1000
+
+            if track.metrics is not None:
+                track.metrics.update(ear, mar, track.pose.pitch)
+
+            faces.append(FaceResult(
+                rect, shape, ear, mar, eyes_closed, mar > self.MOUTH_AR_THRESH,
+                image_points, track.pose, track.id, track.metrics))
+
+        if profiler is not None and faces and pose_frame:
+            profiler.add('pose', pose_ms)
+
+        # Faces not found this frame still count in their tracks' windows
+        if self.fatigue_fps:
+            for track in self.tracks.tracks:
+                if track.missed and track.metrics is not None:
+                    track.metrics.update(None, None)
+
+        return faces
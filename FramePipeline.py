@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+"""
+Building blocks for the live capture -> analysis -> display pipeline
+Each stage runs on its own thread and hands frames to the next one through
+a bounded queue. Camera sources keep only the newest frames so latency
+cannot build up, video files never drop a frame
+"""
+import collections
+import threading
+import time
+
+
+class FramePacket:
+    """A frame travelling through the pipeline"""
+    def __init__(self, index, frame, capture_time):
+        self.index = index                # frame number in the source
+        self.frame = frame
+        self.capture_time = capture_time  # time.perf_counter() when it was read
+        self.result = None                # FrameResult once analyzed
+        self.seeked = False               # first frame after a seek
+
+
+class FrameQueue:
+    """Bounded queue between two pipeline stages
+
+    With drop_oldest a put on a full queue discards the oldest item
+    ("latest frame wins"), otherwise it waits for room.
+    """
+    def __init__(self, maxsize, drop_oldest):
+        self.maxsize = maxsize
+        self.drop_oldest = drop_oldest
+        self.items = collections.deque()
+        self.condition = threading.Condition()
+        self.closed = False
+        self.dropped = 0
+
+    @property
+    def depth(self):
+        return len(self.items)
+
+    def put(self, item, timeout=None):
+        """Add item, returns False if it could not be added in time or the queue is closed"""
+        with self.condition:
+            if self.drop_oldest:
+                if len(self.items) >= self.maxsize:
+                    self.items.popleft()
+                    self.dropped += 1
+            elif not self.condition.wait_for(
+                    lambda: self.closed or len(self.items) < self.maxsize, timeout):
+                return False
+            if self.closed:
+                return False
+            self.items.append(item)
+            self.condition.notify_all()
+            return True
+
+    def get(self, timeout=None):
+        """Oldest item, or None if none arrived in time or the queue is closed and empty"""
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.closed or self.items, timeout):
+                return None
+            if not self.items:
+                return None
+            item = self.items.popleft()
+            self.condition.notify_all()
+            return item
+
+    def get_latest(self):
+        """Newest item without waiting, older ones are discarded; None if empty"""
+        with self.condition:
+            if not self.items:
+                return None
+            item = self.items.pop()
+            self.dropped += len(self.items)
+            self.items.clear()
+            self.condition.notify_all()
+            return item
+
+    def clear(self):
+        with self.condition:
+            self.items.clear()
+            self.condition.notify_all()
+
+    def close(self):
+        """Wake up every waiting thread; later puts fail and gets drain what is left"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+
+class CaptureStage(threading.Thread):
+    """Reads frames from a cv2.VideoCapture into a FrameQueue
+
+    Used for cameras; video files play through a PlaybackController, which
+    can also seek and pause. profiler, if set, receives the decode time of
+    every frame.
+    """
+    def __init__(self, capture, queue, profiler=None):
+        super().__init__(daemon=True)
+        self.capture = capture
+        self.queue = queue
+        self.profiler = profiler
+        self.running = True
+        self.finished = False     # source exhausted or failed
+        self.index = 0
+
+    def stop(self):
+        self.running = False
+
+    def run(self):
+        while self.running:
+            profiler = self.profiler
+            if profiler is not None:
+                start = time.perf_counter()
+            ret, frame = self.capture.read()
+            if not ret or frame is None:
+                break
+            if profiler is not None:
+                profiler.record('decode', start)
+            packet = FramePacket(self.index, frame, time.perf_counter())
+            self.index += 1
+
+            # Lossless queues wait for room, checking now and then for stop()
+            while self.running and not self.queue.put(packet, timeout=0.1):
+                if self.queue.closed:
+                    self.running = False
+
+        self.finished = True
+        self.queue.close()
@@ -12,6 +12,18 @@ model_points = np.array([
     (150.0, -150.0, -125.0)      # Right mouth corner 55
 ])
 
+# Point sticking out of the nose, projected to draw the pose line
+nose_end_point3D = np.array([(0.0, 0.0, 1000.0)])
+
+# solvePnP algorithms the estimator can use. SQPnP needs OpenCV >= 4.5.3
+SOLVERS = {
+    'iterative': cv2.SOLVEPNP_ITERATIVE,
+    'epnp': cv2.SOLVEPNP_EPNP,
+}
+if hasattr(cv2, 'SOLVEPNP_SQPNP'):
+    SOLVERS['sqpnp'] = cv2.SOLVEPNP_SQPNP
+
+
 # Checks if a matrix is a valid rotation matrix.
 def isRotationMatrix(R):
     Rt = np.transpose(R)
@@ -24,8 +36,11 @@ def isRotationMatrix(R):
 # Calculates rotation matrix to euler angles
 # The result is the same as MATLAB except the order
 # of the euler angles ( x and z are swapped ).
-def rotationMatrixToEulerAngles(R):
-    assert(isRotationMatrix(R))
+# Matrices coming from cv2.Rodrigues are valid rotations,
+# so callers on the hot path can skip the check.
+def rotationMatrixToEulerAngles(R, check=True):
+    if check:
+        assert(isRotationMatrix(R))
     sy = math.sqrt(R[0, 0] * R[0, 0] + R[1, 0] * R[1, 0])
     singular = sy < 1e-6
     if not singular:
@@ -39,37 +54,116 @@ def rotationMatrixToEulerAngles(R):
     return np.array([x, y, z])
 
 
-def getHeadTiltAndCoords(size, image_points, frame_height):
-    focal_length = size[1]
-    center = (size[1]/2, size[0]/2)
-    camera_matrix = np.array([[focal_length, 0, center[0]], [
-        0, focal_length, center[1]], [0, 0, 1]], dtype="double")
+class HeadPose:
+    """Head pose of one face in one frame"""
+    def __init__(self, head_tilt, yaw, pitch, roll, rotation_vector,
+                 translation_vector, starting_point, ending_point,
+                 ending_point_alternate):
+        self.head_tilt = head_tilt    # degrees, as reported by getHeadTiltAndCoords
+        self.yaw = yaw                # degrees, rotation around the vertical axis
+        self.pitch = pitch            # degrees, 0 facing the camera
+        self.roll = roll              # degrees, rotation around the viewing axis
+        self.rotation_vector = rotation_vector
+        self.translation_vector = translation_vector
+        # points for the two illustration lines
+        self.starting_point = starting_point
+        self.ending_point = ending_point
+        self.ending_point_alternate = ending_point_alternate
+
+
+class HeadPoseEstimator:
+    """Head pose from the six image points of one face, frame after frame
+
+    The camera matrix is computed once per frame size. With the iterative
+    solver and warm_start the previous frame's pose seeds solvePnP, which
+    then needs only a few refinement steps; call reset() when the face is
+    lost so a stale pose is not used as the starting point. Run
+    benchmarks/head_pose_solvers.py to compare cost and error per solver.
+    """
+    def __init__(self, solver='iterative', warm_start=True):
+        if solver not in SOLVERS:
+            raise ValueError(f"Unknown solvePnP solver: {solver}")
+        self.solver = solver
+        self.flags = SOLVERS[solver]
+        # only the iterative solver can start from a guess
+        self.warm_start = warm_start and solver == 'iterative'
+        self.dist_coeffs = np.zeros((4, 1))  # Assuming no lens distortion
+        self.camera_matrices = {}
+        self.rotation_vector = None
+        self.translation_vector = None
+
+    def reset(self):
+        """Forget the previous pose"""
+        self.rotation_vector = None
+        self.translation_vector = None
 
-    # print "Camera Matrix :\n {0}".format(camera_matrix)
+    def camera_matrix(self, size):
+        """Camera intrinsics for a frame of size (height, width)"""
+        key = (size[0], size[1])
+        camera_matrix = self.camera_matrices.get(key)
+        if camera_matrix is None:
+            focal_length = size[1]
+            center = (size[1]/2, size[0]/2)
+            camera_matrix = np.array([[focal_length, 0, center[0]], [
+                0, focal_length, center[1]], [0, 0, 1]], dtype="double")
+            self.camera_matrices[key] = camera_matrix
+        return camera_matrix
 
-    dist_coeffs = np.zeros((4, 1))  # Assuming no lens distortion
-    (_, rotation_vector, translation_vector) = cv2.solvePnP(model_points, image_points,
-                                                                  camera_matrix, dist_coeffs, 
-                                                                  flags = cv2.SOLVEPNP_ITERATIVE)  # flags=cv2.CV_ITERATIVE)
+    def estimate(self, size, image_points):
+        """HeadPose for the image points of a frame of size (height, width)"""
+        camera_matrix = self.camera_matrix(size)
 
-    # print "Rotation Vector:\n {0}".format(rotation_vector)
-    # print "Translation Vector:\n {0}".format(translation_vector)
-    # Project a 3D point (0, 0 , 1000.0) onto the image plane
-    # We use this to draw a line sticking out of the nose_end_point2D
-    (nose_end_point2D, _) = cv2.projectPoints(np.array(
-        [(0.0, 0.0, 1000.0)]), rotation_vector, translation_vector, camera_matrix, dist_coeffs)
+        if self.warm_start:
+            if self.rotation_vector is None:
+                # Cold start from a closed-form solution, the iterative
+                # solver alone sometimes converges to a flipped pose that
+                # warm starting would then carry along
+                (_, self.rotation_vector, self.translation_vector) = cv2.solvePnP(
+                    model_points, image_points, camera_matrix, self.dist_coeffs,
+                    flags=SOLVERS.get('sqpnp', cv2.SOLVEPNP_EPNP))
+            (_, rotation_vector, translation_vector) = cv2.solvePnP(
+                model_points, image_points, camera_matrix, self.dist_coeffs,
+                self.rotation_vector.copy(), self.translation_vector.copy(),
+                useExtrinsicGuess=True, flags=self.flags)
+        else:
+            (_, rotation_vector, translation_vector) = cv2.solvePnP(
+                model_points, image_points, camera_matrix, self.dist_coeffs,
+                flags=self.flags)
+        self.rotation_vector = rotation_vector
+        self.translation_vector = translation_vector
 
-    #get rotation matrix from the rotation vector
-    rotation_matrix, _ = cv2.Rodrigues(rotation_vector)
+        # Project a 3D point (0, 0 , 1000.0) onto the image plane
+        # We use this to draw a line sticking out of the nose_end_point2D
+        (nose_end_point2D, _) = cv2.projectPoints(
+            nose_end_point3D, rotation_vector, translation_vector, camera_matrix, self.dist_coeffs)
 
-    #calculate head tilt angle in degrees
-    head_tilt_degree = abs(
-        [-180] - np.rad2deg([rotationMatrixToEulerAngles(rotation_matrix)[0]]))
+        #get rotation matrix from the rotation vector
+        rotation_matrix, _ = cv2.Rodrigues(rotation_vector)
+        (x, y, z) = np.rad2deg(rotationMatrixToEulerAngles(rotation_matrix, check=False))
 
-    #calculate starting and ending points for the two lines for illustration
-    starting_point = (int(image_points[0][0]), int(image_points[0][1]))
-    ending_point = (int(nose_end_point2D[0][0][0]), int(nose_end_point2D[0][0][1]))
+        #calculate head tilt angle in degrees
+        head_tilt_degree = abs(-180 - x)
+        # the model's y axis points up and the image's down, so facing the
+        # camera is x = +-180; fold that to 0
+        pitch = (x % 360) - 180
+
+        #calculate starting and ending points for the two lines for illustration
+        starting_point = (int(image_points[0][0]), int(image_points[0][1]))
+        ending_point = (int(nose_end_point2D[0][0][0]), int(nose_end_point2D[0][0][1]))
+
+        ending_point_alternate = (ending_point[0], size[0] // 2)
+
+        return HeadPose(head_tilt_degree, y, pitch, z, rotation_vector, translation_vector,
+                        starting_point, ending_point, ending_point_alternate)
+
+
+_default_estimator = HeadPoseEstimator(warm_start=False)
+
+
+def getHeadTiltAndCoords(size, image_points, frame_height):
+    pose = _default_estimator.estimate(size, image_points)
 
-    ending_point_alternate = (ending_point[0], frame_height // 2)
+    ending_point_alternate = (pose.ending_point[0], frame_height // 2)
 
-    return head_tilt_degree, starting_point, ending_point, ending_point_alternate
+    return (np.array([pose.head_tilt]), pose.starting_point, pose.ending_point,
+            ending_point_alternate)
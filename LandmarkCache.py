@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+"""
+Persistent per-video landmark cache
+Stores the face rectangles and 68 landmarks of every frame in memory-mapped
+.npy files, keyed by the video content and the analysis settings, so that
+re-exporting, replaying or re-thresholding a video skips dlib entirely
+"""
+import hashlib
+import json
+import os
+import dlib
+import numpy as np
+from EAR import eye_aspect_ratios
+from MAR import mouth_aspect_ratios
+
+
+CACHE_DIR = './landmark_cache'
+
+# Faces stored per frame, extra faces are dropped
+MAX_FACES = 4
+
+# Extra frames allocated on top of the container's frame count, which is
+# only an estimate for some formats
+CAPACITY_MARGIN = 0.02
+
+
+def video_hash(path, cache_dir=CACHE_DIR):
+    """SHA-256 of the video file contents
+
+    Hashing a multi-hour recording takes a while, so the digest is
+    remembered per (path, size, modification time).
+    """
+    stat = os.stat(path)
+    index_path = os.path.join(cache_dir, 'hashes.json')
+    key = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+
+    try:
+        with open(index_path) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = {}
+    if key in index:
+        return index[key]
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    index[key] = digest.hexdigest()
+
+    # Several BatchAnalyzer processes may hash at once: each writes its own
+    # temporary file and swaps it in, so readers never see a partial index
+    # (a concurrent entry may be dropped, it is just hashed again)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f)
+    os.replace(tmp_path, index_path)
+    return index[key]
+
+
+class LandmarkCache:
+    """Cached faces of one video for one set of analysis settings
+
+    settings is a JSON-serializable dict of everything that changes which
+    faces and landmarks are found (see FrameAnalyzer.cache_settings);
+    thresholds are not part of it, so changing them reuses the cache.
+    Frames are indexed in decoding order starting at 0.
+    """
+    def __init__(self, video_path, settings, cache_dir=CACHE_DIR, max_faces=MAX_FACES):
+        self.video_path = video_path
+        self.settings = settings
+        self.max_faces = max_faces
+        self.video_hash = video_hash(video_path, cache_dir)
+        key = hashlib.sha256(
+            (self.video_hash + json.dumps(settings, sort_keys=True)).encode()).hexdigest()[:16]
+        self.path = os.path.join(cache_dir, key)
+
+        self.counts = None      # (capacity,) faces per frame
+        self.rects = None       # (capacity, max_faces, 4) left, top, right, bottom
+        self.landmarks = None   # (capacity, max_faces, 68, 2)
+        self.meta = self._read_meta()
+
+    @property
+    def complete(self):
+        """True if every frame of the video is in the cache"""
+        return bool(self.meta and self.meta.get('complete'))
+
+    @property
+    def frames(self):
+        return self.meta['frames'] if self.meta else 0
+
+    def _read_meta(self):
+        try:
+            with open(os.path.join(self.path, 'meta.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self):
+        tmp_path = os.path.join(self.path, 'meta.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self.meta, f)
+        os.replace(tmp_path, os.path.join(self.path, 'meta.json'))
+
+    def _map(self, mode):
+        capacity = self.meta['capacity']
+
+        def open_array(name, dtype, shape):
+            path = os.path.join(self.path, name)
+            if mode == 'w+':
+                return np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=shape)
+            return np.load(path, mmap_mode=mode)
+
+        self.counts = open_array('counts.npy', np.uint8, (capacity,))
+        self.rects = open_array('rects.npy', np.int16, (capacity, self.max_faces, 4))
+        self.landmarks = open_array('landmarks.npy', np.int16, (capacity, self.max_faces, 68, 2))
+
+    def create(self, frame_count):
+        """Allocate an empty cache for about frame_count frames"""
+        os.makedirs(self.path, exist_ok=True)
+        capacity = int(frame_count * (1 + CAPACITY_MARGIN)) + 100
+        self.meta = {
+            'video': os.path.basename(self.video_path),
+            'video_hash': self.video_hash,
+            'settings': self.settings,
+            'max_faces': self.max_faces,
+            'capacity': capacity,
+            'frames': 0,
+            'complete': False,
+        }
+        self._write_meta()
+        self._map('w+')
+
+    def attach(self, writable=False):
+        """Map an existing cache, e.g. from another process"""
+        self._map('r+' if writable else 'r')
+
+    def write(self, index, faces):
+        """Store the FaceResults (or objects with rect and shape) of frame index
+
+        Returns False once the cache is full.
+        """
+        if index >= len(self.counts):
+            return False
+        faces = faces[:self.max_faces]
+        self.counts[index] = len(faces)
+        for i, face in enumerate(faces):
+            r = face.rect
+            self.rects[index, i] = (r.left(), r.top(), r.right(), r.bottom())
+            self.landmarks[index, i] = face.shape
+        return True
+
+    def flush(self):
+        """Write the mapped arrays to disk"""
+        self.counts.flush()
+        self.rects.flush()
+        self.landmarks.flush()
+
+    def finish(self, frames):
+        """Mark the first frames frames as written and the cache as usable"""
+        if frames > len(self.counts):
+            # The video has more frames than there was room for
+            print(f"[WARNING] Landmark cache too small for {self.video_path}, not saved")
+            return
+        self.flush()
+        self.meta['frames'] = frames
+        self.meta['complete'] = True
+        self._write_meta()
+
+    def read(self, index):
+        """(rects, shapes) of frame index, None past the end of the cache"""
+        if self.counts is None:
+            self.attach()
+        if index >= self.frames:
+            return None
+        count = int(self.counts[index])
+        rects = [dlib.rectangle(*(int(v) for v in self.rects[index, i])) for i in range(count)]
+        shapes = [self.landmarks[index, i].astype('int') for i in range(count)]
+        return rects, shapes
+
+    def iter_metrics(self, chunk_frames=100000):
+        """Yield (start, counts, ears, mars) for consecutive blocks of frames
+
+        ears and mars are (frames, max_faces) arrays computed in one
+        vectorized pass per block; entries beyond a frame's face count are
+        NaN. Only one block is in memory at a time, so this works on
+        multi-hour recordings.
+        """
+        if self.counts is None:
+            self.attach()
+        for start in range(0, self.frames, chunk_frames):
+            end = min(start + chunk_frames, self.frames)
+            counts = np.asarray(self.counts[start:end])
+            landmarks = np.asarray(self.landmarks[start:end])
+            with np.errstate(divide='ignore', invalid='ignore'):
+                (_, _, ears) = eye_aspect_ratios(landmarks)
+                mars = mouth_aspect_ratios(landmarks)
+            empty = np.arange(self.max_faces)[None, :] >= counts[:, None]
+            ears[empty] = np.nan
+            mars[empty] = np.nan
+            yield start, counts, ears, mars
+
+
+def open_cache(video_path, settings, cache_dir=CACHE_DIR):
+    """LandmarkCache for video_path, or None if the cache cannot be used"""
+    try:
+        return LandmarkCache(video_path, settings, cache_dir)
+    except OSError as e:
+        print(f"[WARNING] Landmark cache unavailable: {e}")
+        return None
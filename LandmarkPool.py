@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+"""
+Parallel landmark prediction
+dlib's Python bindings keep the GIL while predicting, so threads would
+run one face at a time. The pool instead sends a crop around each face to
+worker processes, each holding its own predictor. The workers are
+spawned, not forked: the pool is started from the GUI's analysis thread,
+and forking a process with other threads running (Tk, capture) can copy
+a lock held by one of them and hang the child
+"""
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import cv2
+import dlib
+import numpy as np
+import ModelRegistry
+
+# Context kept around the face box in the crop, as a fraction of its size.
+# The predictor only looks at pixels near the box
+CROP_MARGIN = 0.5
+
+
+def _init_worker():
+    cv2.setNumThreads(1)
+    ModelRegistry.get_predictor()
+
+
+def _predict(crop, box):
+    """Landmarks of the face at box (left, top, right, bottom) in crop"""
+    shape = ModelRegistry.get_predictor()(crop, dlib.rectangle(*box))
+    return np.array([(p.x, p.y) for p in shape.parts()], dtype=int)
+
+
+def face_crop(image, rect, margin=CROP_MARGIN):
+    """(crop, box inside the crop, (x, y) offset of the crop) for rect"""
+    (h, w) = image.shape[:2]
+    mx = int((rect.right() - rect.left()) * margin)
+    my = int((rect.bottom() - rect.top()) * margin)
+    x0 = max(0, rect.left() - mx)
+    y0 = max(0, rect.top() - my)
+    x1 = min(w, rect.right() + mx + 1)
+    y1 = min(h, rect.bottom() + my + 1)
+    crop = np.ascontiguousarray(image[y0:y1, x0:x1])
+    box = (rect.left() - x0, rect.top() - y0, rect.right() - x0, rect.bottom() - y0)
+    return crop, box, (x0, y0)
+
+
+class LandmarkPool:
+    """Predicts the landmarks of several faces at once in worker processes"""
+    def __init__(self, workers):
+        self.workers = workers
+        self.pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                        mp_context=multiprocessing.get_context('spawn'))
+
+    def predict(self, image, rects):
+        """(68, 2) landmark arrays of rects in image, in order"""
+        jobs = []
+        for rect in rects:
+            (crop, box, offset) = face_crop(image, rect)
+            jobs.append((self.pool.submit(_predict, crop, box), offset))
+        return [future.result() + np.array(offset) for future, offset in jobs]
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
@@ -1,17 +1,31 @@
-from scipy.spatial import distance as dist
+import numpy as np
 
-def mouth_aspect_ratio(mouth):
-    # compute the euclidean distances between the two sets of
-    # vertical mouth landmarks (x, y)-coordinates
-    A = dist.euclidean(mouth[2], mouth[10])  # 51, 59
-    B = dist.euclidean(mouth[4], mouth[8])  # 53, 57
+# indexes in the 68 point model of the points compared by the MAR,
+# the mouth slice used by the detector starts at landmark 49
+MOUTH_A = [51, 53, 49]
+MOUTH_B = [59, 57, 55]
+
+
+def _ratio(a, b):
+    # euclidean distances between the point pairs along the last axis,
+    # two vertical distances over twice the horizontal one
+    d = np.sqrt(((a - b) ** 2).sum(axis=-1))
+    return (d[..., 0] + d[..., 1]) / (2.0 * d[..., 2])
 
-    # compute the euclidean distance between the horizontal
-    # mouth landmark (x, y)-coordinates
-    C = dist.euclidean(mouth[0], mouth[6])  # 49, 55
 
-    # compute the mouth aspect ratio
-    mar = (A + B) / (2.0 * C)
+def mouth_aspect_ratio(mouth):
+    # mouth is the array of mouth (x, y)-coordinates starting at
+    # landmark 49, or a (N, 19, 2) batch of them
+    mouth = np.asarray(mouth, dtype=np.float64)
+    # compare the two sets of vertical mouth landmarks (51, 59 and
+    # 53, 57) and the horizontal mouth landmarks (49, 55)
+    return _ratio(mouth[..., [2, 4, 0], :], mouth[..., [10, 8, 6], :])
+
 
-    # return the mouth aspect ratio
-    return mar
\ No newline at end of file
+def mouth_aspect_ratios(landmarks):
+    # landmarks is a (68, 2) array of facial landmarks or a (N, 68, 2)
+    # batch of them; returns the mouth aspect ratio, as a float for a
+    # single face and as a (N,) array for a batch
+    landmarks = np.asarray(landmarks)
+    return _ratio(landmarks[..., MOUTH_A, :].astype(np.float64),
+                  landmarks[..., MOUTH_B, :].astype(np.float64))
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+"""
+Process-wide registry for the dlib models
+The shape predictor is loaded once per process and shared by every thread,
+face detectors are built once per thread and backend and reused for its
+lifetime
+"""
+import os
+import threading
+import time
+import dlib
+from FaceDetectors import create_detector, detector_spec
+
+
+PREDICTOR_PATH = './dlib_shape_predictor/shape_predictor_68_face_landmarks.dat'
+
+_lock = threading.Lock()
+_predictors = {}               # model path -> dlib.shape_predictor
+_thread_data = threading.local()
+
+# model name -> {'seconds': load time, 'rss_mb': resident memory added by the load}
+load_stats = {}
+
+
+def resident_memory_mb():
+    """Current resident memory of this process in MB, None if unknown"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        # peak, not current, resident memory (KB on Linux, bytes on macOS)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except ImportError:
+        return None
+
+
+def _timed_load(name, loader):
+    rss_before = resident_memory_mb()
+    start = time.perf_counter()
+    model = loader()
+    seconds = time.perf_counter() - start
+    rss_after = resident_memory_mb()
+    rss_mb = None
+    if rss_before is not None and rss_after is not None:
+        rss_mb = rss_after - rss_before
+    load_stats[name] = {'seconds': seconds, 'rss_mb': rss_mb}
+    return model
+
+
+def get_predictor(path=PREDICTOR_PATH):
+    """Landmark predictor for path, loaded on first use
+
+    dlib.shape_predictor is read-only once loaded, so the same instance
+    is shared by all threads of the process.
+    """
+    with _lock:
+        predictor = _predictors.get(path)
+        if predictor is None:
+            print(f"[INFO] Loading facial landmark predictor {os.path.basename(path)}...")
+            predictor = _timed_load(os.path.basename(path),
+                                    lambda: dlib.shape_predictor(path))
+            _predictors[path] = predictor
+        return predictor
+
+
+def get_detector(spec=None):
+    """Face detector of backend spec for the calling thread
+
+    spec is a FaceDetectors spec, by default the one of the environment
+    (HOG unless set). Detectors must not be used concurrently, so every
+    thread gets its own instance, built on its first call and reused
+    afterwards.
+    """
+    spec = detector_spec(spec)
+    detectors = getattr(_thread_data, 'detectors', None)
+    if detectors is None:
+        detectors = _thread_data.detectors = {}
+    detector = detectors.get(spec)
+    if detector is None:
+        name = 'frontal_face_detector' if spec == 'hog' else f"face detector {spec}"
+        detector = _timed_load(name, lambda: create_detector(spec))
+        detectors[spec] = detector
+    return detector
+
+
+def is_loaded(path=PREDICTOR_PATH):
+    """True if the predictor at path is already in memory"""
+    with _lock:
+        return path in _predictors
+
+
+def report():
+    """One line per loaded model with its load time and memory cost"""
+    lines = []
+    for name, stats in load_stats.items():
+        rss = f"{stats['rss_mb']:.1f} MB" if stats['rss_mb'] is not None else "n/a"
+        lines.append(f"{name}: {stats['seconds'] * 1000:.0f} ms, +{rss}")
+    rss_total = resident_memory_mb()
+    if rss_total is not None:
+        lines.append(f"process resident memory: {rss_total:.1f} MB")
+    return "\n".join(lines)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+"""
+Overlay rendering
+Draws a FrameResult from FrameAnalyzer at one of several detail levels.
+Analysis never draws, so runs that only need the numbers (batch analysis,
+metrics, benchmarks) skip this step and pay nothing for it
+"""
+import time
+import cv2
+from imutils import face_utils
+from FrameAnalyzer import POSE_LANDMARKS
+
+# Detail levels, each one draws everything the previous ones do:
+#   none    nothing
+#   alerts  face boxes and IDs, alert texts, MAR and head tilt values
+#   hulls   eye and mouth hulls, head pose points and lines
+#   debug   all 68 landmarks, numbered
+OVERLAY_LEVELS = ('none', 'alerts', 'hulls', 'debug')
+
+# English labels, used when the caller does not pass its own translations
+DEFAULT_LABELS = {
+    'face_found': 'face(s) found',
+    'eyes_closed': 'EYES CLOSED!',
+    'yawning': 'YAWNING!',
+    'head_tilt': 'Head Tilt:',
+    'mar': 'MAR:',
+}
+
+# Facial landmark index ranges
+(lStart, lEnd) = face_utils.FACIAL_LANDMARKS_IDXS["left_eye"]
+(rStart, rEnd) = face_utils.FACIAL_LANDMARKS_IDXS["right_eye"]
+(mStart, mEnd) = (49, 68)
+
+
+def lower_level(a, b):
+    """The less detailed of two overlay levels"""
+    return min(a, b, key=OVERLAY_LEVELS.index)
+
+
+def draw_overlay(result, level='hulls', labels=None, profiler=None):
+    """Draw the analysis of result on result.frame at level and return it
+
+    profiler, if set, is a Profiler that receives the drawing time as the
+    'overlay' stage. Level 'none' returns the frame untouched.
+    """
+    if level not in OVERLAY_LEVELS:
+        raise ValueError(f"Unknown overlay level {level!r}, expected one of {OVERLAY_LEVELS}")
+    frame = result.frame
+    if level == 'none':
+        return frame
+    if labels is None:
+        labels = DEFAULT_LABELS
+    if profiler is not None:
+        start = time.perf_counter()
+    detail = OVERLAY_LEVELS.index(level)
+    hulls = detail >= OVERLAY_LEVELS.index('hulls')
+
+    if len(result.faces) > 0:
+        text = f"{len(result.faces)} {labels['face_found']}"
+        cv2.putText(frame, text, (10, 20),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
+
+    for face in result.faces:
+        (bX, bY, bW, bH) = face_utils.rect_to_bb(face.rect)
+        cv2.rectangle(frame, (bX, bY), (bX + bW, bY + bH), (0, 255, 0), 2)
+        if face.track_id is not None and len(result.faces) > 1:
+            cv2.putText(frame, f"#{face.track_id}", (bX, bY - 5),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+
+        # Eyes
+        if hulls:
+            leftEyeHull = cv2.convexHull(face.shape[lStart:lEnd])
+            rightEyeHull = cv2.convexHull(face.shape[rStart:rEnd])
+            cv2.drawContours(frame, [leftEyeHull], -1, (0, 255, 0), 1)
+            cv2.drawContours(frame, [rightEyeHull], -1, (0, 255, 0), 1)
+
+        if face.eyes_closed:
+            cv2.putText(frame, labels['eyes_closed'], (300, 40),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
+
+        # Mouth
+        if hulls:
+            mouthHull = cv2.convexHull(face.shape[mStart:mEnd])
+            cv2.drawContours(frame, [mouthHull], -1, (0, 255, 0), 1)
+        cv2.putText(frame, f"{labels['mar']}: {face.mar:.2f}", (500, 20),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+
+        if face.yawning:
+            cv2.putText(frame, labels['yawning'], (500, 50),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
+
+        if hulls:
+            # Landmarks
+            if level == 'debug':
+                for (i, (x, y)) in enumerate(face.shape):
+                    # key landmarks in green, everything else in red
+                    color = (0, 255, 0) if i in POSE_LANDMARKS else (0, 0, 255)
+                    cv2.circle(frame, (int(x), int(y)), 1, color, -1)
+                    cv2.putText(frame, str(i + 1), (int(x) - 10, int(y) - 10),
+                                cv2.FONT_HERSHEY_SIMPLEX, 0.35, color, 1)
+            else:
+                for i in POSE_LANDMARKS:
+                    (x, y) = face.shape[i]
+                    cv2.circle(frame, (int(x), int(y)), 2, (0, 255, 0), -1)
+
+            # Head pose
+            for p in face.image_points:
+                cv2.circle(frame, (int(p[0]), int(p[1])), 3, (0, 0, 255), -1)
+
+            (start_point, end_point, end_point_alt) = face.pose_lines
+            cv2.line(frame, start_point, end_point, (255, 0, 0), 2)
+            cv2.line(frame, start_point, end_point_alt, (0, 0, 255), 2)
+
+        if face.head_tilt:
+            cv2.putText(frame, f"{labels['head_tilt']} {face.head_tilt:.1f}°", (10, 50),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
+
+    if profiler is not None:
+        profiler.record('overlay', start)
+    return frame
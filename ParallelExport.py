@@ -0,0 +1,395 @@
+#!/usr/bin/env python
+"""
+Segmented, resumable video export
+Splits the video into frame ranges, analyzes and encodes them in a process
+pool (or one after the other) and joins the annotated segments back
+together in order. A manifest next to the segments records every finished
+one with the face track state at its boundaries, so an export that was
+interrupted resumes from the segments already on disk
+"""
+import json
+import math
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import ModelRegistry
+from FrameAnalyzer import FrameAnalyzer, EYE_AR_CONSEC_FRAMES
+from FaceTracks import states_match
+from Overlay import draw_overlay
+from VideoEncoder import VideoEncoder
+from LandmarkCache import LandmarkCache, open_cache
+
+
+# Chunks shorter than this are not worth a worker of their own
+MIN_CHUNK_FRAMES = 150
+
+# Chunks per worker, more chunks balance the load better and give
+# finer-grained progress
+CHUNKS_PER_WORKER = 3
+
+# Longest segment, bounds the work lost when an export is interrupted
+SEGMENT_FRAMES = 900
+
+MANIFEST_NAME = 'manifest.json'
+
+
+def split_ranges(total_frames, chunks, align=1):
+    """Split [0, total_frames) into at most chunks contiguous (start, end) ranges
+
+    Every range starts at a multiple of align.
+    """
+    chunks = max(1, min(chunks, total_frames // MIN_CHUNK_FRAMES))
+    step = -(-total_frames // chunks)
+    step = -(-step // align) * align
+    return [(start, min(start + step, total_frames))
+            for start in range(0, total_frames, step)]
+
+
+def _init_worker():
+    # One predictor per worker process, and no OpenCV threads competing
+    # with the other workers for the same cores
+    cv2.setNumThreads(1)
+    ModelRegistry.get_predictor()
+
+
+def _export_chunk(video_path, chunk_path, start, end, fps, labels, overlay, analyzer_options,
+                  initial_state, last_chunk, cache_mode, profiler=None):
+    """Analyze and encode frames [start, end) of video_path into chunk_path
+
+    initial_state is the face track state (TrackManager.get_state) to
+    start from. If it is None the tracks and their closed-eyes counters are
+    rebuilt by analyzing the frames just before start without writing
+    them; the returned dict holds the state the chunk started and ended
+    with, so the caller can check the guess against the real state left by
+    the previous chunk. Frames are analyzed with their number in the
+    video, so with start a multiple of detect_interval the face detector
+    runs on the same frames as in a continuous analysis. cache_mode
+    'read' takes the faces from the landmark cache, 'write' stores them
+    there, None skips it. profiler, if set, receives the decode and
+    analysis times of the chunk's frames.
+    """
+    analyzer = FrameAnalyzer(**analyzer_options, profiler=profiler)
+    frame_size = analyzer.frame_size
+    vs = cv2.VideoCapture(video_path)
+
+    cache = None
+    if cache_mode is not None:
+        cache = LandmarkCache(video_path, analyzer.cache_settings())
+        cache.attach(writable=cache_mode == 'write')
+
+    if initial_state is None:
+        first = max(0, start - (EYE_AR_CONSEC_FRAMES - 1))
+    else:
+        first = start
+        analyzer.tracks.set_state(initial_state)
+    analyzer.frame_index = first
+    vs.set(cv2.CAP_PROP_POS_FRAMES, first)
+
+    # Warm up the counter on the frames before the chunk
+    for position in range(first, start):
+        ret, frame = vs.read()
+        if not ret:
+            break
+        cached = cache.read(position) if cache_mode == 'read' else None
+        analyzer.analyze(frame, cached)
+
+    entry_state = analyzer.tracks.get_state()
+
+    # Chunks are intermediate files, MJPG encodes fast and the join decodes them again
+    writer = VideoEncoder(chunk_path, fps, frame_size, backend='opencv', fourcc='MJPG')
+    frames = 0
+    position = start
+    # The last chunk runs to the end of the file, the reported frame count
+    # is only an estimate for some containers
+    while last_chunk or position < end:
+        if profiler is not None:
+            t = time.perf_counter()
+        ret, frame = vs.read()
+        if not ret:
+            break
+        if profiler is not None:
+            profiler.record('decode', t)
+        position += 1
+
+        cached = cache.read(position - 1) if cache_mode == 'read' else None
+        result = analyzer.analyze(frame, cached)
+        if result is None:
+            continue
+
+        if cache_mode == 'write':
+            cache.write(position - 1, result.faces)
+
+        writer.write(draw_overlay(result, overlay, labels, profiler=profiler))
+        frames += 1
+
+    writer.close()
+    vs.release()
+    if cache_mode == 'write':
+        cache.flush()
+
+    return {
+        'end': position,
+        'frames': frames,
+        'entry_state': entry_state,
+        'exit_state': analyzer.tracks.get_state(),
+    }
+
+
+class ExportManifest:
+    """Checkpoint of a segmented export, kept in parts_dir/manifest.json
+
+    key identifies the export (source file, settings and overlay); a
+    manifest with another key is discarded. Every finished segment is
+    stored with the dict _export_chunk returned, whether or not its entry
+    state has been checked against the previous segment yet. record() may
+    be called from several threads and rewrites the file atomically.
+    """
+    def __init__(self, parts_dir, key):
+        self.path = os.path.join(parts_dir, MANIFEST_NAME)
+        self.key = json.loads(json.dumps(key))
+        self.lock = threading.Lock()
+        self.data = None
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            if data.get('key') == self.key:
+                self.data = data
+        except (OSError, ValueError):
+            pass
+        self.resumed = self.data is not None
+        if self.data is None:
+            self.data = {'key': self.key, 'ranges': None, 'cache_mode': None,
+                         'elapsed_s': 0.0, 'segments': {}}
+        self.session_start = time.perf_counter()
+        self.session_elapsed = self.data['elapsed_s']
+
+    @property
+    def ranges(self):
+        return [tuple(r) for r in self.data['ranges']] if self.data['ranges'] else None
+
+    def segment(self, index):
+        return self.data['segments'].get(str(index))
+
+    def record(self, index, chunk):
+        with self.lock:
+            self.data['segments'][str(index)] = chunk
+            self.save()
+
+    def save(self):
+        self.data['elapsed_s'] = self.session_elapsed + time.perf_counter() - self.session_start
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.data, f)
+        os.replace(tmp_path, self.path)
+
+    def progress(self):
+        return manifest_progress(self.data)
+
+
+def manifest_progress(data):
+    """(frames done, total frames, frames/second, seconds left) of a manifest, over all sessions"""
+    done = sum(s['frames'] for s in data['segments'].values())
+    total = data['key']['frames']
+    elapsed = data['elapsed_s']
+    fps = done / elapsed if elapsed else 0.0
+    eta = max(total - done, 0) / fps if fps else None
+    return done, total, fps, eta
+
+
+def export_progress(output_path):
+    """manifest_progress() of an unfinished export of output_path, or None"""
+    try:
+        with open(os.path.join(output_path + '.parts', MANIFEST_NAME)) as f:
+            return manifest_progress(json.load(f))
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def export_key(video_path, total_frames, fps, labels, overlay, analyzer_options):
+    """What an export depends on; a checkpoint is only reused when this matches"""
+    return {
+        'video': os.path.abspath(video_path),
+        'size': os.path.getsize(video_path),
+        'mtime': int(os.path.getmtime(video_path)),
+        'frames': total_frames,
+        'fps': fps,
+        'labels': labels,
+        'overlay': overlay,
+        'analyzer_options': analyzer_options,
+    }
+
+
+def export_video(video_path, output_path, labels=None, overlay='hulls',
+                 analyzer_options=None, workers=None, progress=None, encoder='auto',
+                 use_cache=True, profiler=None):
+    """Export the annotated video in checkpointed segments
+
+    With workers > 1 the segments are rendered in a pool of worker
+    processes, with workers=1 one after the other in this process, each
+    starting from the exact state the previous one ended with. Segments
+    start on multiples of detect_interval, so with any detect_interval the
+    face detector runs on the same frames as in one continuous analysis
+    (the window search of roi_margin still restarts at every segment). The
+    segments and their manifest are kept in output_path + '.parts' until
+    the final file is written; calling this again after an interruption
+    reuses every finished segment. overlay is the Overlay level drawn on
+    the frames and encoder the VideoEncoder backend of the output file.
+    analyzer_options are passed to the FrameAnalyzer of every segment and
+    must include a frame_size if the default one is not wanted. progress,
+    if given, is called as progress(frames_done, total_frames, fps,
+    eta_seconds) every time a segment finishes, from the manifest, so it
+    includes earlier sessions. With use_cache=False the landmark cache is
+    neither read nor written. profiler, if set, receives the stage times of
+    the segments rendered in this process (all of them with workers=1) and
+    of the final encode. Returns a dict with the frame count, elapsed
+    seconds, frames/second, workers and segments used, the segments
+    re-rendered and resumed, and the encoder backend with its own
+    frames/second.
+    """
+    start_time = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    analyzer_options = dict(analyzer_options or {})
+    frame_size = analyzer_options.setdefault('frame_size', (800, 600))
+
+    vs = cv2.VideoCapture(video_path)
+    total_frames = int(vs.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = vs.get(cv2.CAP_PROP_FPS) or 30
+    vs.release()
+    if total_frames <= 0:
+        raise ValueError(f"Could not read frame count of {video_path}")
+
+    parts_dir = output_path + '.parts'
+    os.makedirs(parts_dir, exist_ok=True)
+    manifest = ExportManifest(parts_dir, export_key(video_path, total_frames, fps, labels,
+                                                    overlay, analyzer_options))
+    if manifest.ranges is None:
+        chunks = max(workers * CHUNKS_PER_WORKER, math.ceil(total_frames / SEGMENT_FRAMES))
+        manifest.data['ranges'] = split_ranges(total_frames, chunks,
+                                               analyzer_options.get('detect_interval', 1))
+    ranges = manifest.ranges
+    chunk_paths = [os.path.join(parts_dir, f'chunk_{i:05d}.avi') for i in range(len(ranges))]
+    resumable = [i for i in range(len(ranges))
+                 if manifest.segment(i) is not None and os.path.exists(chunk_paths[i])]
+    if manifest.resumed:
+        print(f"[INFO] Resuming export of {video_path}: {len(resumable)} of {len(ranges)} "
+              f"segments already done")
+
+    # Reuse the landmarks of a previous run, or record them for the next
+    # one. A resumed export only keeps writing a cache it created itself
+    cache = None
+    if use_cache:
+        cache = open_cache(video_path, FrameAnalyzer(**analyzer_options).cache_settings())
+    cache_mode = None
+    if cache is not None:
+        if cache.complete:
+            cache_mode = 'read'
+        elif not manifest.resumed:
+            cache.create(total_frames)
+            cache_mode = 'write'
+        elif manifest.data['cache_mode'] == 'write' and cache.meta is not None:
+            cache.attach(writable=True)
+            cache_mode = 'write'
+    manifest.data['cache_mode'] = cache_mode
+    manifest.save()
+
+    def report():
+        if progress is not None:
+            progress(*manifest.progress())
+
+    def render(i, initial_state):
+        start, end = ranges[i]
+        return (video_path, chunk_paths[i], start, end, fps, labels, overlay,
+                analyzer_options, initial_state, i == len(ranges) - 1, cache_mode)
+
+    # Walk the segments in order carrying the real track state across the
+    # boundaries. Only min(counter, CONSEC - 1) of each face changes what
+    # gets drawn, so a segment is rendered again only if it started from a
+    # guess of the faces or those counters that was wrong. A segment that
+    # started from the right state also ends in the right one.
+    rerendered = 0
+    resumed = 0
+    frames_read = 0
+    state = []
+    cap = EYE_AR_CONSEC_FRAMES - 1
+    if workers == 1:
+        for i in range(len(ranges)):
+            chunk = manifest.segment(i) if i in resumable else None
+            if chunk is not None and states_match(chunk['entry_state'], state, cap):
+                resumed += 1
+            else:
+                chunk = _export_chunk(*render(i, state), profiler=profiler)
+                manifest.record(i, chunk)
+            state = chunk['exit_state']
+            frames_read = chunk['end']
+            report()
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(ranges)),
+                                 initializer=_init_worker) as pool:
+            # Segments on disk are checked in the walk. The first one to
+            # render after them gets the exact state, the others a warm-up
+            futures = {}
+            known = []
+            for i in range(len(ranges)):
+                if i in resumable:
+                    known = manifest.segment(i)['exit_state'] if known is not None else None
+                    continue
+                futures[i] = pool.submit(_export_chunk, *render(i, known))
+                futures[i].add_done_callback(
+                    lambda f, i=i: f.exception() is None and manifest.record(i, f.result()))
+                known = None
+
+            for i in range(len(ranges)):
+                if i in futures:
+                    chunk = futures[i].result()
+                else:
+                    chunk = manifest.segment(i)
+                    resumed += 1
+                if not states_match(chunk['entry_state'], state, cap):
+                    if i not in futures:
+                        resumed -= 1
+                    chunk = pool.submit(_export_chunk, *render(i, state)).result()
+                    manifest.record(i, chunk)
+                    rerendered += 1
+                state = chunk['exit_state']
+                frames_read = chunk['end']
+                report()
+
+    if cache_mode == 'write':
+        cache.finish(frames_read)
+
+    # Join the segments in order, decoding the next frames while the last
+    # ones encode
+    frames_done = 0
+    writer = VideoEncoder(output_path, fps, frame_size, encoder, profiler=profiler)
+    for chunk_path in chunk_paths:
+        vs = cv2.VideoCapture(chunk_path)
+        while True:
+            ret, frame = vs.read()
+            if not ret:
+                break
+            writer.write(frame)
+            frames_done += 1
+        vs.release()
+    encoded = writer.close()
+    shutil.rmtree(parts_dir, ignore_errors=True)
+
+    seconds = time.perf_counter() - start_time
+    stats = {
+        'frames': frames_done,
+        'seconds': seconds,
+        'fps': frames_done / seconds if seconds else 0.0,
+        'workers': workers,
+        'chunks': len(ranges),
+        'rerendered': rerendered,
+        'resumed': resumed,
+        'encoder': encoded['backend'],
+        'encode_fps': encoded['fps'],
+    }
+    print(f"[INFO] Export: {stats['frames']} frames in {seconds:.1f}s "
+          f"({stats['fps']:.1f} fps, {workers} workers, {len(ranges)} segments, "
+          f"{resumed} resumed, {rerendered} re-rendered, "
+          f"{encoded['backend']} encoder at {encoded['fps']:.1f} fps)")
+    return stats
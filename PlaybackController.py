@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+"""
+Video file playback with fast, frame-accurate seeking
+A reader thread owns the cv2.VideoCapture and is driven through a small
+command queue, so Tk callbacks never touch the capture while it decodes.
+It decodes ahead into a FrameQueue, and seeks use an index of the
+video's keyframes and timestamps, built on the first open and cached on
+disk, to decode forward instead of seeking whenever that is less work
+"""
+import hashlib
+import os
+import re
+import subprocess
+import threading
+import time
+from queue import Queue, Empty
+import cv2
+import numpy as np
+from FramePipeline import FramePacket
+from VideoEncoder import ffmpeg_path
+
+INDEX_DIR = './playback_index'
+
+# Bumped when the index format changes, older cached indexes are rebuilt
+INDEX_VERSION = 1
+
+# framecrc packet line: stream, dts, pts, duration, size, checksum[, F=flags]
+FRAMECRC_PACKET = re.compile(r'^\s*0,\s*(-?\d+),\s*(-?\d+),.*?(?:F=0x([0-9a-fA-F]+))?\s*$')
+FRAMECRC_TIME_BASE = re.compile(r'^#tb 0: (\d+)/(\d+)')
+
+
+class FrameIndex:
+    """Presentation timestamps and keyframe numbers of a video's frames
+
+    Frames are numbered in presentation order from 0, as
+    cv2.CAP_PROP_POS_FRAMES counts them.
+    """
+    def __init__(self, timestamps, keyframes, source):
+        self.timestamps = np.asarray(timestamps, dtype=np.float64)  # seconds, per frame
+        self.keyframes = np.asarray(keyframes, dtype=np.int64)      # sorted frame numbers
+        self.source = source                                        # 'ffmpeg' or 'opencv'
+
+    @property
+    def frames(self):
+        return len(self.timestamps)
+
+    def keyframe_before(self, frame):
+        """Last keyframe at or before frame, where decoding can start"""
+        position = np.searchsorted(self.keyframes, frame, side='right') - 1
+        return int(self.keyframes[position]) if position >= 0 else 0
+
+    def time_of(self, frame):
+        """Timestamp of frame in seconds"""
+        return float(self.timestamps[min(max(frame, 0), self.frames - 1)])
+
+    def frame_at(self, seconds):
+        """Last frame shown at or before seconds"""
+        return max(0, int(np.searchsorted(self.timestamps, seconds + 1e-6, side='right')) - 1)
+
+    def save(self, path):
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, version=INDEX_VERSION, timestamps=self.timestamps,
+                 keyframes=self.keyframes, source=self.source)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Index stored at path, None if missing, unreadable or outdated"""
+        try:
+            with np.load(path) as data:
+                if int(data['version']) != INDEX_VERSION:
+                    return None
+                return cls(data['timestamps'], data['keyframes'], str(data['source']))
+        except (OSError, ValueError, KeyError):
+            return None
+
+
+def _index_with_ffmpeg(path):
+    """Index from the packets of the first video stream, read without decoding"""
+    command = [ffmpeg_path(), '-v', 'error', '-i', path, '-map', '0:v:0',
+               '-c', 'copy', '-f', 'framecrc', '-']
+    output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+    time_base = None
+    packets = []    # (pts, keyframe)
+    for line in output.splitlines():
+        match = FRAMECRC_TIME_BASE.match(line)
+        if match:
+            time_base = int(match.group(1)) / int(match.group(2))
+            continue
+        match = FRAMECRC_PACKET.match(line)
+        if match:
+            flags = int(match.group(3), 16) if match.group(3) else 1
+            packets.append((int(match.group(2)), bool(flags & 1)))
+    if time_base is None or not packets:
+        raise ValueError(f"No video packets found in {path}")
+    packets.sort()
+    first = packets[0][0]
+    timestamps = [(pts - first) * time_base for pts, _ in packets]
+    keyframes = [frame for frame, (_, key) in enumerate(packets) if key]
+    return FrameIndex(timestamps, keyframes, 'ffmpeg')
+
+
+def _index_with_opencv(path):
+    """Index from OpenCV's raw packets; timestamps assume a constant frame rate"""
+    capture = cv2.VideoCapture(path, cv2.CAP_FFMPEG, [cv2.CAP_PROP_FORMAT, -1])
+    if not capture.isOpened():
+        raise IOError(f"Could not open {path}")
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+    keyframes = []
+    frames = 0
+    while capture.grab():
+        if capture.get(cv2.CAP_PROP_LRF_HAS_KEY_FRAME):
+            keyframes.append(frames)
+        frames += 1
+    capture.release()
+    return FrameIndex(np.arange(frames) / fps, keyframes or [0], 'opencv')
+
+
+def build_index(path):
+    """FrameIndex of the video at path, with ffmpeg if installed, else OpenCV"""
+    if ffmpeg_path():
+        try:
+            return _index_with_ffmpeg(path)
+        except (subprocess.CalledProcessError, ValueError) as e:
+            print(f"[WARNING] ffmpeg could not index {path}, using OpenCV: {e}")
+    return _index_with_opencv(path)
+
+
+def load_index(path, index_dir=INDEX_DIR):
+    """Cached FrameIndex of the video at path, built and stored on first use
+
+    The cache is keyed by the path, size and modification time of the file.
+    """
+    stat = os.stat(path)
+    key = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    index_path = os.path.join(index_dir, hashlib.sha1(key.encode()).hexdigest()[:16] + '.npz')
+    index = FrameIndex.load(index_path)
+    if index is not None:
+        return index
+
+    start = time.perf_counter()
+    index = build_index(path)
+    print(f"[INFO] Indexed {os.path.basename(path)} with {index.source}: {index.frames} frames, "
+          f"{len(index.keyframes)} keyframes in {time.perf_counter() - start:.2f}s")
+    try:
+        os.makedirs(index_dir, exist_ok=True)
+        index.save(index_path)
+    except OSError as e:
+        print(f"[WARNING] Could not store the index of {path}: {e}")
+    return index
+
+
+class PlaybackController(threading.Thread):
+    """Plays a video file into a FrameQueue, with seeks from any thread
+
+    Only this thread touches capture once started. seek() and stop() queue
+    commands that it runs between frames; a burst of seeks, as from
+    dragging a slider, only performs the last one. With index, a
+    FrameIndex of the video, a seek to a frame after the current position
+    within the same keyframe interval decodes forward, which is cheaper
+    than seeking back to the keyframe. The first packet after a seek has
+    seeked set. paused is an optional callable; while it returns True no
+    frames are read, but a seek still delivers the frame it lands on.
+    profiler, if set, receives the decode time of every frame.
+    """
+    def __init__(self, capture, queue, index=None, paused=None, profiler=None):
+        super().__init__(daemon=True)
+        self.capture = capture
+        self.queue = queue
+        self.video_index = index
+        self.paused = paused
+        self.profiler = profiler
+        self.commands = Queue()
+        self.running = True
+        self.finished = False     # source exhausted or failed
+        self.index = 0            # number of the next frame to decode
+        self.seeked = False       # the next frame follows a seek
+        self.seeks = 0
+        self.seek_ms = 0.0        # time of the last seek
+
+    def seek(self, frame_index):
+        self.commands.put(('seek', frame_index))
+
+    def stop(self):
+        self.running = False
+        self.commands.put(('stop', None))
+
+    def _commands(self, timeout=None):
+        """Run the queued commands, waiting up to timeout for the first one
+
+        Returns True if a seek was performed.
+        """
+        target = None
+        try:
+            command = self.commands.get(timeout=timeout) if timeout else self.commands.get_nowait()
+            while True:
+                (name, value) = command
+                if name == 'stop':
+                    self.running = False
+                elif name == 'seek':
+                    target = value
+                command = self.commands.get_nowait()
+        except Empty:
+            pass
+        if target is None or not self.running:
+            return False
+        self._seek(target)
+        return True
+
+    def _seek(self, target):
+        start = time.perf_counter()
+        index = self.video_index
+        if index is not None:
+            target = min(max(int(target), 0), index.frames - 1)
+        if index is not None and index.keyframe_before(target) <= self.index <= target:
+            # Same keyframe interval, ahead of us: decoding on costs less
+            # than going back to the keyframe
+            for _ in range(target - self.index):
+                if not self.capture.grab():
+                    break
+        else:
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, target)
+            position = int(round(self.capture.get(cv2.CAP_PROP_POS_FRAMES)))
+            for _ in range(target - position):
+                if not self.capture.grab():
+                    break
+        self.index = target
+        self.seeked = True
+        self.queue.clear()
+        self.seeks += 1
+        self.seek_ms = (time.perf_counter() - start) * 1000
+
+    def _read(self):
+        """Decode the next frame into the queue, False at the end of the source"""
+        profiler = self.profiler
+        if profiler is not None:
+            start = time.perf_counter()
+        ret, frame = self.capture.read()
+        if not ret or frame is None:
+            return False
+        if profiler is not None:
+            profiler.record('decode', start)
+        packet = FramePacket(self.index, frame, time.perf_counter())
+        packet.seeked = self.seeked
+        self.index += 1
+        self.seeked = False
+
+        # Wait for room, a new command drops the frame: after a seek it
+        # belongs to the old position
+        while self.running and not self.queue.put(packet, timeout=0.05):
+            if self.queue.closed:
+                self.running = False
+            elif not self.commands.empty():
+                break
+        return True
+
+    def run(self):
+        while self.running:
+            if self.paused is not None and self.paused():
+                # Show where a seek lands even while paused
+                if self._commands(timeout=0.05) and not self._read():
+                    break
+                continue
+            self._commands()
+            if self.running and not self._read():
+                break
+
+        self.finished = True
+        self.queue.close()
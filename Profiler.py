@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+"""
+Per-stage timing of the frame pipeline
+Keeps the last durations of every stage in fixed-size ring buffers and
+reports rolling percentiles. Code being timed holds an optional profiler
+and only calls it when it is not None, so a disabled profiler costs a
+single comparison per stage
+"""
+import json
+import time
+import numpy as np
+
+
+# Pipeline stages in processing order
+STAGES = ('decode', 'resize', 'color', 'detect', 'landmarks', 'ear_mar',
+          'pose', 'overlay', 'encode', 'display')
+
+# Samples kept per stage
+WINDOW = 1000
+
+
+class Profiler:
+    """Rolling per-stage timings
+
+    Usage, with profiler possibly None:
+
+        if profiler is not None:
+            start = time.perf_counter()
+        ...
+        if profiler is not None:
+            profiler.record('detect', start)
+
+    Each stage is normally recorded from a single thread; stages may come
+    from different threads. No lock is taken, a summary read while a stage
+    is being recorded can miss that one sample.
+    """
+    def __init__(self, window=WINDOW, stages=STAGES):
+        self.window = window
+        self.stages = list(stages)
+        self.samples = {stage: np.zeros(window) for stage in self.stages}
+        self.counts = dict.fromkeys(self.stages, 0)
+        self.started = time.time()
+
+    def record(self, stage, start):
+        """Record the time since start (a time.perf_counter() value) for stage"""
+        self.add(stage, (time.perf_counter() - start) * 1000)
+
+    def add(self, stage, ms):
+        """Record a duration of ms milliseconds for stage"""
+        if stage not in self.samples:
+            self.stages.append(stage)
+            self.samples[stage] = np.zeros(self.window)
+            self.counts[stage] = 0
+        count = self.counts[stage]
+        self.samples[stage][count % self.window] = ms
+        self.counts[stage] = count + 1
+
+    def reset(self):
+        for stage in self.stages:
+            self.counts[stage] = 0
+        self.started = time.time()
+
+    def summary(self):
+        """{stage: {count, mean_ms, p50_ms, p95_ms, p99_ms}} of the stages seen so far"""
+        summary = {}
+        for stage in self.stages:
+            count = self.counts[stage]
+            if count == 0:
+                continue
+            values = self.samples[stage][:min(count, self.window)]
+            (p50, p95, p99) = np.percentile(values, (50, 95, 99))
+            summary[stage] = {
+                'count': count,
+                'mean_ms': round(float(values.mean()), 3),
+                'p50_ms': round(float(p50), 3),
+                'p95_ms': round(float(p95), 3),
+                'p99_ms': round(float(p99), 3),
+            }
+        return summary
+
+    def dump(self, path):
+        """Write the summary to path as JSON"""
+        data = {
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+            'window': self.window,
+            'stages': self.summary(),
+        }
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2)
+        print(f"[INFO] Stage timings written to {path}")
+
+    def format(self):
+        """Summary as a fixed-width text table"""
+        lines = [f"{'stage':<10} {'count':>7} {'mean':>8} {'p50':>8} {'p95':>8} {'p99':>8}"]
+        for stage, s in self.summary().items():
+            lines.append(f"{stage:<10} {s['count']:>7} {s['mean_ms']:>8.2f} {s['p50_ms']:>8.2f} "
+                         f"{s['p95_ms']:>8.2f} {s['p99_ms']:>8.2f}")
+        return "\n".join(lines)
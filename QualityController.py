@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""
+Adaptive quality of service for live analysis
+Steps a FrameAnalyzer down through cheaper settings when frames take longer
+than the time budget, and back up once there is headroom again, so alerts
+keep firing in real time on slow machines
+"""
+
+
+# Degradation ladder, every level keeps the savings of the ones before it.
+# detect_scale and detect_interval never go below the analyzer's own setting,
+# overlay is the most detailed Overlay level allowed
+QUALITY_LEVELS = [
+    ('full', {}),
+    ('detect_scale', {'detect_scale': 2.0}),
+    ('detect_interval', {'detect_interval': 5}),
+    ('overlay_alerts', {'overlay': 'alerts'}),
+    ('pose_skip', {'pose_every': 3}),
+]
+
+
+class QualityController:
+    """Picks the quality level of an analyzer from its frame times
+
+    budget_ms is the time a frame may take, e.g. 1000 / source fps. The
+    frame times are smoothed with a moving average; the level goes down
+    when the average exceeds the budget and up when it falls below
+    recover_ratio times the budget. After every change the controller waits
+    hold_frames frames for the average to settle. A step up that has to be
+    undone soon after doubles the wait before the next step up, so the
+    level does not keep flipping between two settings.
+    """
+    def __init__(self, analyzer, budget_ms, levels=QUALITY_LEVELS,
+                 recover_ratio=0.6, hold_frames=30, max_hold_frames=960):
+        self.analyzer = analyzer
+        self.budget_ms = budget_ms
+        self.levels = levels
+        self.recover_ratio = recover_ratio
+        self.hold_frames = hold_frames
+        self.max_hold_frames = max_hold_frames
+
+        # The analyzer's own settings, level 0
+        self.base = {
+            'detect_scale': analyzer.detect_scale,
+            'detect_interval': analyzer.tracker.detect_interval,
+            'pose_every': analyzer.pose_every,
+        }
+        self.level = 0
+        self.overlay = 'debug'         # overlay level cap, see Overlay.lower_level
+        self.frame_ms = 0.0            # moving average of the frame times
+        self.frames_at_level = 0
+        self.recover_hold = hold_frames
+        self.recovered = False         # the last change was a step up
+
+    @property
+    def name(self):
+        return self.levels[self.level][0]
+
+    def settings(self, level):
+        """Analyzer settings of level, with the savings of all lower levels"""
+        settings = dict(self.base, overlay='debug')
+        for (_, overrides) in self.levels[1:level + 1]:
+            settings.update(overrides)
+        settings['detect_scale'] = max(settings['detect_scale'], self.base['detect_scale'])
+        settings['detect_interval'] = max(settings['detect_interval'], self.base['detect_interval'])
+        settings['pose_every'] = max(settings['pose_every'], self.base['pose_every'])
+        return settings
+
+    def apply(self, level):
+        settings = self.settings(level)
+        self.level = level
+        self.analyzer.detect_scale = settings['detect_scale']
+        self.analyzer.tracker.detect_interval = settings['detect_interval']
+        self.analyzer.pose_every = settings['pose_every']
+        self.overlay = settings['overlay']
+        self.frames_at_level = 0
+
+    def update(self, frame_ms):
+        """Report the time of one frame, returns True if the level changed"""
+        if self.frame_ms == 0.0:
+            self.frame_ms = frame_ms
+        else:
+            self.frame_ms = 0.9 * self.frame_ms + 0.1 * frame_ms
+        self.frames_at_level += 1
+
+        if self.frame_ms > self.budget_ms and self.level < len(self.levels) - 1 and \
+                self.frames_at_level >= self.hold_frames:
+            if self.recovered and self.frames_at_level < 2 * self.recover_hold:
+                self.recover_hold = min(2 * self.recover_hold, self.max_hold_frames)
+            self.recovered = False
+            self.apply(self.level + 1)
+        elif self.frame_ms < self.recover_ratio * self.budget_ms and self.level > 0 and \
+                self.frames_at_level >= self.recover_hold:
+            if self.recovered:
+                # Two steps up in a row, the previous one held
+                self.recover_hold = self.hold_frames
+            self.recovered = True
+            self.apply(self.level - 1)
+        else:
+            return False
+
+        print(f"[INFO] Quality level {self.level} ({self.name}): "
+              f"{self.frame_ms:.1f} ms per frame, budget {self.budget_ms:.1f} ms")
+        return True
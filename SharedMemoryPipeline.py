@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+"""
+Multi-process analysis of one video source over shared memory
+A capture process decodes and resizes frames straight into a ring of
+shared-memory slots; worker processes, each with its own detector and
+predictor, find the faces and landmarks of a slot in place, so frames are
+never pickled or copied between processes. Results come back in frame
+order and the stateful part of the analysis (tracks, counters, head pose,
+fatigue metrics) stays in the main process, fed to
+FrameAnalyzer.analyze(frame, cached=...)
+"""
+import collections
+import multiprocessing
+import os
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+import cv2
+import dlib
+import numpy as np
+from imutils import face_utils
+import ModelRegistry
+from FrameAnalyzer import detect_faces
+
+# Frames a worker is given at once: enough to keep it busy while its
+# results travel back, and what is redone when it dies
+WORKER_INFLIGHT = 2
+
+# Free slots on top of the in-flight ones, so capture runs ahead while
+# results wait to be put back in order
+EXTRA_SLOTS = 4
+
+# Workers respawned per configured worker before giving up; a worker that
+# dies on every frame (missing model, broken frame) must not loop forever
+MAX_RESTARTS_PER_WORKER = 3
+
+
+def _attach(name, slots, shape):
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray((slots,) + shape, dtype=np.uint8, buffer=shm.buf)
+
+
+def _capture(source, shm_name, slots, shape, conn):
+    """Capture process: fills free slots and announces (index, slot)
+
+    The main process hands slots back once it is done with them and sends
+    None to stop early. None is sent at the end of the source.
+    """
+    (shm, frames) = _attach(shm_name, slots, shape)
+    (h, w) = shape[:2]
+    free = collections.deque(range(slots))
+    vs = cv2.VideoCapture(source)
+    try:
+        conn.send(('fps', vs.get(cv2.CAP_PROP_FPS) or 30.0))
+        index = 0
+        while True:
+            while not free or conn.poll():
+                slot = conn.recv()
+                if slot is None:
+                    return
+                free.append(slot)
+            ret, frame = vs.read()
+            if not ret or frame is None:
+                break
+            slot = free.popleft()
+            if frame.shape[:2] == (h, w):
+                frames[slot] = frame
+            else:
+                cv2.resize(frame, (w, h), dst=frames[slot])
+            conn.send((index, slot))
+            index += 1
+        conn.send(None)
+    except (EOFError, OSError):
+        pass    # main process gone
+    finally:
+        vs.release()
+        del frames
+        shm.close()
+
+
+def _worker(shm_name, slots, shape, conn, detect_scale, upsample, detector_backend):
+    """Worker process: faces and landmarks of the slots it is sent"""
+    cv2.setNumThreads(1)
+    (shm, frames) = _attach(shm_name, slots, shape)
+    detector = ModelRegistry.get_detector(detector_backend)
+    predictor = ModelRegistry.get_predictor()
+    gray = np.empty(shape[:2], dtype=np.uint8)
+    try:
+        while True:
+            task = conn.recv()
+            if task is None:
+                break
+            (index, slot) = task
+            cv2.cvtColor(frames[slot], cv2.COLOR_BGR2GRAY, dst=gray)
+            rects = detect_faces(detector, gray, detect_scale, upsample)
+            shapes = [face_utils.shape_to_np(predictor(gray, rect)) for rect in rects]
+            conn.send((index, [(r.left(), r.top(), r.right(), r.bottom()) for r in rects], shapes))
+    except (EOFError, OSError):
+        pass    # main process gone
+    finally:
+        del frames
+        shm.close()
+
+
+class SharedMemoryPipeline:
+    """Faces and landmarks of every frame of source from worker processes
+
+    Iterating yields (index, frame, (rects, shapes)) in frame order, where
+    frame is a private copy resized to frame_size and (rects, shapes) can be
+    passed as cached to FrameAnalyzer.analyze. Faces are detected on every
+    frame (there is no tracking between frames in the workers) with
+    detect_scale, upsample and detector_backend as in FrameAnalyzer. If a worker dies, the
+    frames it held are sent to a new one, so no frame is lost or repeated.
+
+    Create it after the predictor is loaded in this process: on systems
+    that fork, the workers then share its memory instead of each reading
+    the model file. Call close() when done, or use it as a context manager.
+    """
+    def __init__(self, source, workers=None, frame_size=(800, 600), slots=None,
+                 detect_scale=1.0, upsample=0, detector_backend=None):
+        self.source = source
+        self.workers = workers or os.cpu_count() or 1
+        (w, h) = frame_size
+        self.shape = (h, w, 3)
+        self.slots = slots or self.workers * WORKER_INFLIGHT + EXTRA_SLOTS
+        self.detect_scale = detect_scale
+        self.upsample = upsample
+        self.detector_backend = detector_backend
+        self.fps = None             # of the source, once the capture opened it
+        self.restarts = 0           # workers respawned after dying
+
+        self.shm = shared_memory.SharedMemory(create=True, size=self.slots * h * w * 3)
+        self.frames = np.ndarray((self.slots,) + self.shape, dtype=np.uint8, buffer=self.shm.buf)
+
+        (self.capture_conn, child_conn) = multiprocessing.Pipe()
+        self.capture = multiprocessing.Process(
+            target=_capture, args=(source, self.shm.name, self.slots, self.shape, child_conn),
+            daemon=True)
+        self.capture.start()
+        child_conn.close()
+
+        self.processes = [None] * self.workers
+        self.conns = [None] * self.workers
+        self.pending = [{} for _ in range(self.workers)]   # per worker: frame index -> slot
+        for i in range(self.workers):
+            self._spawn(i)
+
+    def _spawn(self, i):
+        (conn, child_conn) = multiprocessing.Pipe()
+        process = multiprocessing.Process(
+            target=_worker,
+            args=(self.shm.name, self.slots, self.shape, child_conn, self.detect_scale, self.upsample,
+                  self.detector_backend),
+            daemon=True)
+        process.start()
+        child_conn.close()
+        self.processes[i] = process
+        self.conns[i] = conn
+
+    def _restart(self, i, waiting):
+        """Replace dead worker i, its frames go back to the front of waiting"""
+        self.conns[i].close()
+        self.processes[i].join()
+        self.restarts += 1
+        if self.restarts > MAX_RESTARTS_PER_WORKER * self.workers:
+            raise RuntimeError(f"Analysis workers keep dying (exit code {self.processes[i].exitcode})")
+        print(f"[WARNING] Analysis worker {i} died (exit code {self.processes[i].exitcode}), "
+              f"restarting it and resending {len(self.pending[i])} frames")
+        waiting.extendleft(sorted(self.pending[i].items(), reverse=True))
+        self.pending[i] = {}
+        self._spawn(i)
+
+    def _dispatch(self, waiting):
+        """Send waiting frames to the least busy workers with room"""
+        while waiting:
+            i = min(range(self.workers), key=lambda i: len(self.pending[i]))
+            if len(self.pending[i]) >= WORKER_INFLIGHT:
+                return
+            (index, slot) = waiting.popleft()
+            self.pending[i][index] = slot
+            try:
+                self.conns[i].send((index, slot))
+            except OSError:
+                # Died since the last check; restarting requeues this frame too
+                self._restart(i, waiting)
+
+    def _release(self, slot):
+        try:
+            self.capture_conn.send(slot)
+        except OSError:
+            pass    # capture finished, nothing left to fill
+
+    def __iter__(self):
+        waiting = collections.deque()   # (index, slot) captured, not sent to a worker
+        done = {}                       # index -> (slot, rects, shapes) waiting for its turn
+        next_index = 0
+        capturing = True
+        while True:
+            while next_index in done:
+                (slot, rects, shapes) = done.pop(next_index)
+                frame = self.frames[slot].copy()
+                self._release(slot)
+                yield next_index, frame, (rects, shapes)
+                next_index += 1
+            if not capturing and not waiting and not any(self.pending):
+                return
+
+            self._dispatch(waiting)
+            conns = [conn for i, conn in enumerate(self.conns) if self.pending[i]]
+            if capturing:
+                conns.append(self.capture_conn)
+            for conn in wait(conns):
+                if conn is self.capture_conn:
+                    try:
+                        message = conn.recv()
+                    except EOFError:
+                        message = None
+                        if self.capture.exitcode:
+                            print(f"[WARNING] Capture of {self.source} stopped "
+                                  f"(exit code {self.capture.exitcode})")
+                    if message is None:
+                        capturing = False
+                    elif message[0] == 'fps':
+                        self.fps = message[1]
+                    else:
+                        waiting.append(message)
+                    continue
+
+                i = self.conns.index(conn)
+                try:
+                    (index, rects, shapes) = conn.recv()
+                except (EOFError, OSError):
+                    self._restart(i, waiting)
+                    continue
+                slot = self.pending[i].pop(index)
+                done[index] = (slot, [dlib.rectangle(*r) for r in rects], shapes)
+
+    def close(self):
+        """Stop the processes and free the shared memory"""
+        for conn in self.conns + [self.capture_conn]:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+        for process in self.processes + [self.capture]:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        for conn in self.conns + [self.capture_conn]:
+            conn.close()
+        del self.frames
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
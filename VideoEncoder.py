@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+"""
+Asynchronous video encoding
+Frames are handed to a writer thread through a bounded queue, so encoding
+overlaps with analysis instead of stalling it. The writer is either
+OpenCV's VideoWriter or a local ffmpeg process fed raw frames on its
+standard input, with the container picked from the file extension
+"""
+import os
+import shutil
+import subprocess
+import threading
+import time
+import cv2
+import numpy as np
+from FramePipeline import FrameQueue
+
+BACKENDS = ('auto', 'opencv', 'ffmpeg')
+
+# Frames waiting for the writer; a full queue makes write() wait, so a slow
+# encoder slows the producer down instead of piling up frames
+ENCODER_QUEUE_SIZE = 16
+
+# fourcc of the OpenCV backend per container
+OPENCV_FOURCC = {'.mp4': 'mp4v', '.mov': 'mp4v', '.m4v': 'mp4v', '.avi': 'MJPG', '.mkv': 'XVID'}
+
+# Output options of the ffmpeg backend per container
+H264_OPTIONS = ['-c:v', 'libx264', '-preset', 'veryfast', '-crf', '23', '-pix_fmt', 'yuv420p']
+FFMPEG_OPTIONS = {'.mp4': H264_OPTIONS + ['-movflags', '+faststart'],
+                  '.mov': H264_OPTIONS, '.m4v': H264_OPTIONS, '.mkv': H264_OPTIONS,
+                  '.avi': ['-c:v', 'mjpeg', '-q:v', '3']}
+
+
+def ffmpeg_path():
+    """Path of the ffmpeg executable on the PATH, or None"""
+    return shutil.which('ffmpeg')
+
+
+def resolve_backend(backend):
+    """'opencv' or 'ffmpeg' for backend, 'auto' prefers ffmpeg when installed"""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown encoder backend {backend!r}, expected one of {BACKENDS}")
+    if backend == 'auto':
+        return 'ffmpeg' if ffmpeg_path() else 'opencv'
+    if backend == 'ffmpeg' and not ffmpeg_path():
+        raise IOError("ffmpeg not found on the PATH")
+    return backend
+
+
+class OpenCVWriter:
+    """cv2.VideoWriter with the fourcc picked from the file extension"""
+    def __init__(self, path, fps, frame_size, fourcc=None):
+        if fourcc is None:
+            fourcc = OPENCV_FOURCC.get(os.path.splitext(path)[1].lower(), 'mp4v')
+        self.writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, frame_size)
+        if not self.writer.isOpened():
+            raise IOError(f"Could not open {path} for writing with fourcc {fourcc}")
+
+    def write(self, frame):
+        self.writer.write(frame)
+
+    def release(self):
+        self.writer.release()
+
+
+class FFmpegWriter:
+    """Pipes raw BGR frames to an ffmpeg process
+
+    options are the ffmpeg output options, by default the ones of the file
+    extension in FFMPEG_OPTIONS.
+    """
+    def __init__(self, path, fps, frame_size, options=None):
+        if options is None:
+            options = FFMPEG_OPTIONS.get(os.path.splitext(path)[1].lower(), H264_OPTIONS)
+        (w, h) = frame_size
+        self.path = path
+        self.frame_bytes = w * h * 3
+        command = [ffmpeg_path(), '-y', '-loglevel', 'error',
+                   '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{w}x{h}', '-r', f'{fps}',
+                   '-i', '-', '-an'] + options + [path]
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def write(self, frame):
+        frame = np.ascontiguousarray(frame)
+        if frame.nbytes != self.frame_bytes:
+            raise ValueError(f"Frame of {frame.shape} does not match the video size")
+        try:
+            self.process.stdin.write(memoryview(frame).cast('B'))
+        except BrokenPipeError:
+            raise IOError(f"ffmpeg stopped: {self.process.stderr.read().decode(errors='replace')}")
+
+    def release(self):
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        errors = self.process.stderr.read().decode(errors='replace')
+        if self.process.wait() != 0:
+            raise IOError(f"ffmpeg failed writing {self.path}: {errors.strip()}")
+
+
+class VideoEncoder(threading.Thread):
+    """Writes frames to a video file from its own thread
+
+    write() queues a frame and returns; the frame must not be changed
+    afterwards. close() waits for the queued frames to be written and
+    returns the encoding statistics. fps should be the frame rate of the
+    source. backend is one of BACKENDS; fourcc only applies to the OpenCV
+    backend. profiler, if set, receives the time of every frame as the
+    'encode' stage.
+    """
+    def __init__(self, path, fps, frame_size, backend='auto', fourcc=None,
+                 queue_size=ENCODER_QUEUE_SIZE, profiler=None):
+        super().__init__(daemon=True)
+        self.path = path
+        self.fps = fps
+        self.backend = resolve_backend(backend)
+        # Opened here so a bad path or codec fails in the caller's thread
+        if self.backend == 'ffmpeg':
+            self.writer = FFmpegWriter(path, fps, frame_size)
+        else:
+            self.writer = OpenCVWriter(path, fps, frame_size, fourcc)
+        self.queue = FrameQueue(queue_size, drop_oldest=False)
+        self.profiler = profiler
+        self.frames = 0
+        self.encode_seconds = 0.0   # time spent inside the writer
+        self.error = None
+        self.started = time.perf_counter()
+        self.start()
+
+    def write(self, frame):
+        """Queue frame for encoding, waits while the queue is full"""
+        if self.error is not None:
+            raise IOError(f"Encoding {self.path} failed: {self.error}")
+        if not self.queue.put(frame):
+            raise IOError(f"Encoder of {self.path} is closed")
+
+    def run(self):
+        while True:
+            frame = self.queue.get()
+            if frame is None:
+                break
+            start = time.perf_counter()
+            try:
+                self.writer.write(frame)
+            except Exception as e:
+                self.error = e
+                self.queue.close()
+                break
+            self.encode_seconds += time.perf_counter() - start
+            self.frames += 1
+            if self.profiler is not None:
+                self.profiler.record('encode', start)
+
+    def close(self):
+        """Finish the file, returns a dict with the backend, frames, seconds and fps
+
+        seconds is the time spent encoding and fps the encoder's own
+        throughput, frames / seconds.
+        """
+        self.queue.close()
+        self.join()
+        try:
+            self.writer.release()
+        except Exception as e:
+            if self.error is None:
+                self.error = e
+        if self.error is not None:
+            raise IOError(f"Encoding {self.path} failed: {self.error}")
+        return {
+            'backend': self.backend,
+            'frames': self.frames,
+            'seconds': round(self.encode_seconds, 3),
+            'fps': round(self.frames / self.encode_seconds, 1) if self.encode_seconds else 0.0,
+        }
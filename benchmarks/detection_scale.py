@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+"""
+Speed/accuracy of multi-scale face detection
+Runs the HOG detector on every frame of a video for several detection
+scales and upsample counts and compares the boxes and the landmarks
+predicted from them with full-resolution detection
+
+Usage (from the repository root):
+    python benchmarks/detection_scale.py video.mp4 [--frames 300]
+"""
+import argparse
+import os
+import sys
+import time
+import cv2
+import numpy as np
+from imutils import face_utils
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ModelRegistry
+from FrameAnalyzer import detect_faces
+
+SCALES = [1.0, 1.5, 2.0, 3.0, 4.0]
+UPSAMPLES = [0, 1]
+
+
+def iou(a, b):
+    """Intersection over union of two dlib rectangles"""
+    w = min(a.right(), b.right()) - max(a.left(), b.left())
+    h = min(a.bottom(), b.bottom()) - max(a.top(), b.top())
+    if w <= 0 or h <= 0:
+        return 0.0
+    inter = w * h
+    return inter / float(a.area() + b.area() - inter)
+
+
+def load_frames(path, count, frame_size=(800, 600)):
+    vs = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < count:
+        ret, frame = vs.read()
+        if not ret:
+            break
+        frames.append(cv2.cvtColor(cv2.resize(frame, frame_size), cv2.COLOR_BGR2GRAY))
+    vs.release()
+    return frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('video')
+    parser.add_argument('--frames', type=int, default=300)
+    args = parser.parse_args()
+
+    detector = ModelRegistry.get_detector()
+    predictor = ModelRegistry.get_predictor()
+    frames = load_frames(args.video, args.frames)
+    if not frames:
+        sys.exit(f"Could not read frames from {args.video}")
+
+    # Reference: full resolution, no upsampling (the previous behavior)
+    reference = [detect_faces(detector, gray) for gray in frames]
+    reference_shapes = [[face_utils.shape_to_np(predictor(gray, r)) for r in rects]
+                        for gray, rects in zip(frames, reference)]
+    total_faces = sum(len(rects) for rects in reference)
+
+    print(f"{len(frames)} frames, {total_faces} reference faces")
+    print(f"{'scale':>5} {'ups':>3} {'ms/frame':>9} {'recall':>7} {'IoU':>6} {'landmark px':>12}")
+    for upsample in UPSAMPLES:
+        for scale in SCALES:
+            start = time.perf_counter()
+            found = [detect_faces(detector, gray, scale, upsample) for gray in frames]
+            ms = (time.perf_counter() - start) * 1000 / len(frames)
+
+            matched, ious, errors = 0, [], []
+            for gray, rects, ref_rects, ref_shapes in zip(frames, found, reference, reference_shapes):
+                for ref, ref_shape in zip(ref_rects, ref_shapes):
+                    best = max(rects, key=lambda r: iou(r, ref), default=None)
+                    if best is None or iou(best, ref) < 0.5:
+                        continue
+                    matched += 1
+                    ious.append(iou(best, ref))
+                    shape = face_utils.shape_to_np(predictor(gray, best))
+                    errors.append(np.linalg.norm(shape - ref_shape, axis=1).mean())
+
+            recall = matched / total_faces if total_faces else 0.0
+            mean_iou = np.mean(ious) if ious else 0.0
+            mean_error = np.mean(errors) if errors else 0.0
+            print(f"{scale:>5.1f} {upsample:>3d} {ms:>9.1f} {recall:>7.2f} {mean_iou:>6.2f} {mean_error:>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+"""
+Speed/accuracy of the face detector backends
+Runs every backend on the frames of the synthetic fixture videos (see
+make_fixtures.py), resized to the analysis size as in FrameAnalyzer, and
+reports the detection latency per frame and the recall against the face
+boxes the fixtures were made with. Recorded clips in fixtures/recorded/ and
+videos given on the command line have no ground truth, there HOG
+detections are the reference
+
+Usage (from the repository root):
+    python benchmarks/detector_backends.py [video.mp4 ...] [--backends hog haar model.onnx]
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from FaceDetectors import create_detector, detector_name
+from FrameAnalyzer import detect_faces
+from make_fixtures import ensure_fixtures, face_boxes, FIXTURES_DIR, FACE_PATH
+
+FRAME_SIZE = (800, 600)
+
+
+def load_frames(path, count, frame_size=FRAME_SIZE):
+    """Grayscale frames at frame_size and the original (width, height)"""
+    vs = cv2.VideoCapture(path)
+    size = (int(vs.get(cv2.CAP_PROP_FRAME_WIDTH)), int(vs.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    frames = []
+    while len(frames) < count:
+        ret, frame = vs.read()
+        if not ret:
+            break
+        frames.append(cv2.cvtColor(cv2.resize(frame, frame_size), cv2.COLOR_BGR2GRAY))
+    vs.release()
+    return frames, size
+
+
+def fixture_truth(size, faces, count, frame_size=FRAME_SIZE):
+    """Per frame, the (left, top, right, bottom) face boxes at frame_size"""
+    face_shape = cv2.imread(FACE_PATH).shape
+    fx = frame_size[0] / size[0]
+    fy = frame_size[1] / size[1]
+    return [[(x * fx, y * fy, (x + w) * fx, (y + h) * fy)
+             for (x, y, w, h) in face_boxes(size, faces, i, face_shape)]
+            for i in range(count)]
+
+
+def match(rects, boxes):
+    """(boxes with a detection centered inside, detections inside no box)"""
+    found = set()
+    false_positives = 0
+    for rect in rects:
+        center = rect.center()
+        inside = [i for i, (l, t, r, b) in enumerate(boxes)
+                  if l <= center.x <= r and t <= center.y <= b and i not in found]
+        if inside:
+            found.add(inside[0])
+        else:
+            false_positives += 1
+    return len(found), false_positives
+
+
+def run(detector, frames, truth, detect_scale):
+    """Latencies in ms, recall and false positives per frame of detector on frames"""
+    latencies = []
+    found = total = false_positives = 0
+    for gray, boxes in zip(frames, truth):
+        start = time.perf_counter()
+        rects = detect_faces(detector, gray, detect_scale)
+        latencies.append((time.perf_counter() - start) * 1000)
+        (hits, misses) = match(rects, boxes)
+        found += hits
+        total += len(boxes)
+        false_positives += misses
+    return {
+        'median_ms': float(np.median(latencies)),
+        'p95_ms': float(np.percentile(latencies, 95)),
+        'recall': found / total if total else 1.0,
+        'fp_per_frame': false_positives / len(frames),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('videos', nargs='*', help='extra videos, HOG is their reference')
+    parser.add_argument('--backends', nargs='+', default=['hog', 'haar'],
+                        help='detector specs, see FaceDetectors')
+    parser.add_argument('--frames', type=int, default=60)
+    parser.add_argument('--detect-scale', type=float, default=1.0)
+    args = parser.parse_args()
+
+    detectors = {spec: create_detector(spec) for spec in args.backends}
+    cases = []
+    for (size, faces), path in sorted(ensure_fixtures().items()):
+        frames, _ = load_frames(path, args.frames)
+        cases.append((os.path.basename(path), frames, fixture_truth(size, faces, len(frames))))
+    reference = create_detector('hog')
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, 'recorded', '*'))) + args.videos:
+        frames, _ = load_frames(path, args.frames)
+        if not frames:
+            print(f"[WARNING] Could not read frames from {path}")
+            continue
+        truth = [[(r.left(), r.top(), r.right(), r.bottom()) for r in detect_faces(reference, gray)]
+                 for gray in frames]
+        cases.append((os.path.basename(path) + ' (vs hog)', frames, truth))
+
+    print(f"{len(cases)} videos, {args.frames} frames each at {FRAME_SIZE[0]}x{FRAME_SIZE[1]}, "
+          f"detect scale {args.detect_scale}")
+    print(f"{'video':<28} {'backend':<38} {'median ms':>9} {'p95 ms':>8} {'recall':>7} {'fp/frame':>9}")
+    totals = {spec: [] for spec in detectors}
+    for name, frames, truth in cases:
+        for spec, detector in detectors.items():
+            stats = run(detector, frames, truth, args.detect_scale)
+            totals[spec].append(stats)
+            print(f"{name:<28} {detector_name(spec):<38} {stats['median_ms']:9.1f} "
+                  f"{stats['p95_ms']:8.1f} {stats['recall']:7.2f} {stats['fp_per_frame']:9.2f}")
+
+    print("\nMean over all videos")
+    for spec, runs in totals.items():
+        print(f"{'':<28} {detector_name(spec):<38} "
+              f"{np.mean([r['median_ms'] for r in runs]):9.1f} "
+              f"{np.mean([r['p95_ms'] for r in runs]):8.1f} "
+              f"{np.mean([r['recall'] for r in runs]):7.2f} "
+              f"{np.mean([r['fp_per_frame'] for r in runs]):9.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+"""
+Per-call cost and angle error of the head pose solvers
+Projects the head model with known, smoothly changing poses onto an
+800x600 camera, adds pixel noise to the image points and compares the
+yaw, pitch and roll recovered by every HeadPoseEstimator configuration
+
+Usage (from the repository root):
+    python benchmarks/head_pose_solvers.py [--frames 2000] [--noise 1.0]
+"""
+import argparse
+import os
+import sys
+import time
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from HeadPose import (HeadPoseEstimator, SOLVERS, model_points,
+                      rotationMatrixToEulerAngles)
+
+FRAME_SIZE = (600, 800)  # (height, width)
+
+# (name, solver, warm_start)
+CONFIGURATIONS = [('iterative', 'iterative', False),
+                  ('iterative+warm', 'iterative', True)]
+CONFIGURATIONS += [(name, name, False) for name in SOLVERS if name != 'iterative']
+
+
+def angles(rotation_vector):
+    """(yaw, pitch, roll) in degrees, with the same convention as HeadPose"""
+    R, _ = cv2.Rodrigues(rotation_vector)
+    (x, y, z) = np.rad2deg(rotationMatrixToEulerAngles(R, check=False))
+    return np.array([y, (x % 360) - 180, z])
+
+
+def synthetic_sequence(frames, noise, seed=0):
+    """Image points and true (yaw, pitch, roll) of a head moving smoothly"""
+    rng = np.random.default_rng(seed)
+    camera_matrix = HeadPoseEstimator().camera_matrix(FRAME_SIZE)
+    t = np.arange(frames)
+    yaw = 25 * np.sin(t / 40.0)
+    pitch = 15 * np.sin(t / 55.0 + 1.0)
+    roll = 10 * np.sin(t / 70.0 + 2.0)
+
+    sequence = []
+    for i in range(frames):
+        # facing the camera is a rotation of 180 degrees around x
+        R_face = cv2.Rodrigues(np.array([np.pi, 0.0, 0.0]))[0]
+        R_move = cv2.Rodrigues(np.deg2rad([pitch[i], 0.0, 0.0]))[0] @ \
+            cv2.Rodrigues(np.deg2rad([0.0, yaw[i], 0.0]))[0] @ \
+            cv2.Rodrigues(np.deg2rad([0.0, 0.0, roll[i]]))[0]
+        rotation_vector = cv2.Rodrigues(R_move @ R_face)[0]
+        translation_vector = np.array([[20.0 * np.sin(i / 30.0)], [-30.0], [2500.0]])
+        (points, _) = cv2.projectPoints(model_points, rotation_vector, translation_vector,
+                                        camera_matrix, np.zeros((4, 1)))
+        points = points.reshape(-1, 2) + rng.normal(0.0, noise, (len(model_points), 2))
+        sequence.append((points, angles(rotation_vector)))
+    return sequence
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--frames', type=int, default=2000)
+    parser.add_argument('--noise', type=float, default=1.0,
+                        help='standard deviation of the image point noise in pixels')
+    args = parser.parse_args()
+
+    sequence = synthetic_sequence(args.frames, args.noise)
+    print(f"{args.frames} frames, {args.noise:.1f} px noise")
+    print(f"{'solver':<16} {'us/call':>8} {'yaw err':>8} {'pitch err':>10} {'roll err':>9}")
+    for name, solver, warm_start in CONFIGURATIONS:
+        estimator = HeadPoseEstimator(solver, warm_start)
+        errors = []
+        elapsed = 0.0
+        for points, truth in sequence:
+            start = time.perf_counter()
+            pose = estimator.estimate(FRAME_SIZE, points)
+            elapsed += time.perf_counter() - start
+            error = np.abs(np.array([pose.yaw, pose.pitch, pose.roll]) - truth)
+            errors.append(np.minimum(error, 360 - error))
+        errors = np.mean(errors, axis=0)
+        print(f"{name:<16} {elapsed / len(sequence) * 1e6:>8.1f} "
+              f"{errors[0]:>8.2f} {errors[1]:>10.2f} {errors[2]:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""
+Landmark prediction time per frame with several faces, inline and pooled
+Pastes the face in fixtures/face.jpg up to 8 times onto an 800x600
+grayscale frame and predicts the landmarks of every face, once in this
+process and once through a LandmarkPool of each worker count. The pool
+sends a crop per face to its workers, so this shows whether the
+parallelism pays for the crop pickling on the machine at hand
+
+Usage (from the repository root):
+    python benchmarks/landmark_pool.py [--faces 2 4] [--workers 2 4] [--frames 200]
+"""
+import argparse
+import os
+import sys
+import time
+import cv2
+import dlib
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ModelRegistry
+from LandmarkPool import LandmarkPool
+
+FACE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'face.jpg')
+FRAME_SIZE = (600, 800)  # (height, width)
+
+
+def frame_with_faces(faces):
+    """Grayscale frame with faces copies of the fixture face and their boxes"""
+    face = cv2.cvtColor(cv2.imread(FACE_PATH), cv2.COLOR_BGR2GRAY)
+    (fh, fw) = face.shape
+    frame = np.full(FRAME_SIZE, 90, dtype=np.uint8)
+    rects = []
+    for i in range(faces):
+        (row, col) = divmod(i, 4)
+        (x, y) = (10 + col * (fw + 10), 40 + row * (fh + 40))
+        frame[y:y + fh, x:x + fw] = face
+        rects.append(dlib.rectangle(x + 20, y + 40, x + fw - 20, y + fh - 20))
+    return frame, rects
+
+
+def ms_per_frame(predict, frame, rects, frames):
+    predict(frame, rects)  # warm up
+    start = time.perf_counter()
+    for _ in range(frames):
+        predict(frame, rects)
+    return (time.perf_counter() - start) / frames * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--faces', type=int, nargs='+', default=[2, 4])
+    parser.add_argument('--workers', type=int, nargs='+', default=[2, 4])
+    parser.add_argument('--frames', type=int, default=200)
+    args = parser.parse_args()
+
+    predictor = ModelRegistry.get_predictor()
+
+    def inline(frame, rects):
+        return [predictor(frame, rect) for rect in rects]
+
+    pools = {workers: LandmarkPool(workers) for workers in args.workers}
+    print(f"{os.cpu_count()} CPUs, {args.frames} frames")
+    print(f"{'faces':>5} {'inline ms':>10}" + "".join(f" {f'{w} workers ms':>13} {'speedup':>8}"
+                                                   for w in args.workers))
+    try:
+        for faces in args.faces:
+            (frame, rects) = frame_with_faces(min(faces, 8))
+            base = ms_per_frame(inline, frame, rects, args.frames)
+            line = f"{faces:>5} {base:>10.2f}"
+            for workers in args.workers:
+                pooled = ms_per_frame(pools[workers].predict, frame, rects, args.frames)
+                line += f" {pooled:>13.2f} {base / pooled:>7.2f}x"
+            print(line)
+    finally:
+        for pool in pools.values():
+            pool.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+"""
+Synthetic benchmark videos
+Composites the face photo in fixtures/face.jpg onto a plain cabin-like
+background, moving slowly, at several resolutions and face counts. The
+output only depends on the face photo and the parameters, so every
+machine benchmarks the same frames
+
+Usage (from the repository root):
+    python benchmarks/make_fixtures.py [--frames 120] [--force]
+"""
+import argparse
+import os
+import cv2
+import numpy as np
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+FACE_PATH = os.path.join(FIXTURES_DIR, 'face.jpg')
+GENERATED_DIR = os.path.join(FIXTURES_DIR, 'generated')
+
+RESOLUTIONS = [(640, 480), (1280, 720), (1920, 1080)]
+FACE_COUNTS = [1, 2]
+FRAMES = 120
+FPS = 30
+
+
+def fixture_name(size, faces):
+    return f"{size[0]}x{size[1]}_{faces}face.mp4"
+
+
+def fixture_path(size, faces):
+    return os.path.join(GENERATED_DIR, fixture_name(size, faces))
+
+
+def background(size):
+    """Vertical gray gradient with a darker 'window' band"""
+    (w, h) = size
+    column = np.linspace(70, 150, h, dtype=np.float32)[:, None]
+    image = np.repeat(column, w, axis=1)
+    image[:h // 4] += 40
+    return cv2.merge([image, image * 0.95, image * 0.9]).clip(0, 255).astype(np.uint8)
+
+
+def face_size(size, faces, face_shape):
+    """(width, height) of the face photo in a video of size with faces faces"""
+    (w, h) = size
+    face_h = int(h * (0.45 if faces == 1 else 0.35))
+    return int(face_shape[1] * face_h / face_shape[0]), face_h
+
+
+def face_boxes(size, faces, index, face_shape):
+    """(x, y, w, h) of every face photo in frame index, the ground truth of detection"""
+    (w, h) = size
+    (face_w, face_h) = face_size(size, faces, face_shape)
+    boxes = []
+    for k in range(faces):
+        cx = w * (k + 1) / (faces + 1) + 0.03 * w * np.sin(index / 25.0 + k)
+        cy = h * 0.5 + 0.02 * h * np.sin(index / 35.0 + 2 * k)
+        x = int(np.clip(cx - face_w / 2, 0, w - face_w))
+        y = int(np.clip(cy - face_h / 2, 0, h - face_h))
+        boxes.append((x, y, face_w, face_h))
+    return boxes
+
+
+def make_video(path, size, faces, frames=FRAMES, face_path=FACE_PATH):
+    """Write a video of frames frames with faces moving faces"""
+    face = cv2.imread(face_path)
+    if face is None:
+        raise IOError(f"Could not read {face_path}")
+    face = cv2.resize(face, face_size(size, faces, face.shape), interpolation=cv2.INTER_CUBIC)
+
+    base = background(size)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), FPS, size)
+    for i in range(frames):
+        frame = base.copy()
+        for (x, y, face_w, face_h) in face_boxes(size, faces, i, face.shape):
+            frame[y:y + face_h, x:x + face_w] = face
+        writer.write(frame)
+    writer.release()
+
+
+def ensure_fixtures(resolutions=RESOLUTIONS, face_counts=FACE_COUNTS, frames=FRAMES, force=False):
+    """Generate the missing fixture videos, returns {(size, faces): path}"""
+    os.makedirs(GENERATED_DIR, exist_ok=True)
+    paths = {}
+    for size in resolutions:
+        for faces in face_counts:
+            path = fixture_path(size, faces)
+            if force or not os.path.exists(path):
+                print(f"[INFO] Generating {os.path.relpath(path)}")
+                make_video(path, size, faces, frames)
+            paths[(size, faces)] = path
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--frames', type=int, default=FRAMES)
+    parser.add_argument('--force', action='store_true', help='regenerate existing videos')
+    args = parser.parse_args()
+    ensure_fixtures(frames=args.frames, force=args.force)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+"""
+Seek latency and accuracy of video playback
+Times random seeks and 1 and 10 second skips on a video, from the seek
+request to the frame at the target being available, once with a plain
+cv2.VideoCapture set(CAP_PROP_POS_FRAMES) and once through
+PlaybackController with the video's keyframe index, and checks every
+frame reached against a sequential decode of the video
+
+Usage (from the repository root):
+    python benchmarks/seek_latency.py video.mp4 [--seeks 30]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from FramePipeline import FrameQueue
+from PlaybackController import PlaybackController, build_index
+
+
+def decode_all(path):
+    vs = cv2.VideoCapture(path)
+    frames = []
+    while True:
+        ret, frame = vs.read()
+        if not ret:
+            break
+        frames.append(frame)
+    vs.release()
+    return frames
+
+
+def direct(path, targets):
+    """(index, frame, ms) of every seek with set(CAP_PROP_POS_FRAMES) and read()"""
+    vs = cv2.VideoCapture(path)
+    results = []
+    for target in targets:
+        start = time.perf_counter()
+        vs.set(cv2.CAP_PROP_POS_FRAMES, target)
+        (_, frame) = vs.read()
+        results.append((target, frame, (time.perf_counter() - start) * 1000))
+    vs.release()
+    return results
+
+
+def controller(path, index, targets):
+    """(index, frame, ms) of every seek through a PlaybackController"""
+    queue = FrameQueue(8, drop_oldest=False)
+    playback = PlaybackController(cv2.VideoCapture(path), queue, index)
+    playback.start()
+    results = []
+    for target in targets:
+        start = time.perf_counter()
+        playback.seek(target)
+        while True:
+            packet = queue.get(timeout=5)
+            if packet is None or packet.seeked:
+                break
+        if packet is None:
+            raise RuntimeError(f"No frame after seeking to {target}")
+        results.append((packet.index, packet.frame, (time.perf_counter() - start) * 1000))
+    playback.stop()
+    playback.join()
+    return results
+
+
+def report(name, targets, results, reference):
+    wrong = sum(1 for target, (index, frame, _) in zip(targets, results)
+                if index != target or frame is None or not np.array_equal(frame, reference[target]))
+    ms = [r[2] for r in results]
+    print(f"  {name:<22} median {np.median(ms):7.1f} ms  p95 {np.percentile(ms, 95):7.1f} ms  "
+          f"wrong frames {wrong}/{len(targets)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('video')
+    parser.add_argument('--seeks', type=int, default=30)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = build_index(args.video)
+    print(f"Index ({index.source}): {index.frames} frames, {len(index.keyframes)} keyframes, "
+          f"built in {(time.perf_counter() - start) * 1000:.0f} ms")
+    reference = decode_all(args.video)
+    frames = min(len(reference), index.frames)
+    rng = random.Random(0)
+    cases = {'random': [rng.randrange(frames) for _ in range(args.seeks)]}
+    for seconds in (1, 10):
+        skip = index.frame_at(float(seconds))
+        position = rng.randrange(frames // 2)
+        targets = []
+        for _ in range(args.seeks):
+            position = position + skip if position + skip < frames else rng.randrange(frames // 2)
+            targets.append(position)
+        cases[f'forward {seconds}s'] = targets
+    for case, targets in cases.items():
+        print(f"{case} seeks ({len(targets)})")
+        report('VideoCapture.set', targets, direct(args.video, targets), reference)
+        report('PlaybackController', targets, controller(args.video, index, targets), reference)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+"""
+Scaling of the shared-memory analysis pipeline
+Analyzes the first frames of one video in a single process and then with
+SharedMemoryPipeline for 1..N worker processes, and prints the frames per
+second and speedup of each. With --kill one worker is killed halfway
+through every pipeline run, to check that the frames it held are redone
+and the results still match the single-process run exactly
+
+Usage (from the repository root):
+    python benchmarks/shared_memory_scaling.py video.mp4 [--frames 300] [--workers 1 2 4] [--kill]
+"""
+import argparse
+import os
+import signal
+import sys
+import time
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ModelRegistry
+from FrameAnalyzer import FrameAnalyzer
+from SharedMemoryPipeline import SharedMemoryPipeline
+
+
+def faces_of(result):
+    return [((f.rect.left(), f.rect.top(), f.rect.right(), f.rect.bottom()), f.shape.tolist())
+            for f in result.faces]
+
+
+def single_process(video, frames):
+    analyzer = FrameAnalyzer()
+    vs = cv2.VideoCapture(video)
+    results = []
+    start = time.perf_counter()
+    while len(results) < frames:
+        ret, frame = vs.read()
+        if not ret:
+            break
+        results.append(faces_of(analyzer.analyze(frame)))
+    seconds = time.perf_counter() - start
+    vs.release()
+    return results, seconds
+
+
+def pipeline(video, frames, workers, kill):
+    analyzer = FrameAnalyzer()
+    results = []
+    start = time.perf_counter()
+    with SharedMemoryPipeline(video, workers) as frames_in:
+        for index, frame, cached in frames_in:
+            if index >= frames:
+                break
+            if kill and index == frames // 2:
+                os.kill(frames_in.processes[0].pid, signal.SIGKILL)
+            results.append(faces_of(analyzer.analyze(frame, cached)))
+        restarts = frames_in.restarts
+    seconds = time.perf_counter() - start
+    return results, seconds, restarts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('video')
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=sorted({1, 2, os.cpu_count() or 1}))
+    parser.add_argument('--kill', action='store_true',
+                        help='kill a worker halfway through every pipeline run')
+    args = parser.parse_args()
+
+    ModelRegistry.get_predictor()
+    print(f"{os.cpu_count()} CPUs, {args.frames} frames of {args.video}")
+    reference, seconds = single_process(args.video, args.frames)
+    if not reference:
+        sys.exit(f"Could not read frames from {args.video}")
+    base_fps = len(reference) / seconds
+    print(f"{'processes':>10} {'fps':>8} {'speedup':>8} {'restarts':>9} {'matches':>8}")
+    print(f"{'single':>10} {base_fps:8.1f} {1.0:8.2f} {'-':>9} {'-':>8}")
+
+    for workers in args.workers:
+        results, seconds, restarts = pipeline(args.video, len(reference), workers, args.kill)
+        fps = len(results) / seconds
+        matches = results == reference
+        print(f"{workers:>10} {fps:8.1f} {fps / base_fps:8.2f} {restarts:>9} {str(matches):>8}")
+        if not matches:
+            differing = int(np.sum([a != b for a, b in zip(results, reference)]))
+            print(f"[WARNING] {differing} of {len(reference)} frames differ, "
+                  f"{len(reference) - len(results)} missing")
+
+
+if __name__ == '__main__':
+    main()
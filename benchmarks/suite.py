@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+"""
+Benchmark suite of the detection pipeline
+Measures the EAR/MAR functions, getHeadTiltAndCoords, the full analysis
+loop and the export (ParallelExport.export_video) on the synthetic
+fixture videos (see make_fixtures.py) at several resolutions and face
+counts and on any recorded clips in fixtures/recorded/, writes the
+results as JSON and optionally compares them with a stored baseline.
+Runs headless, no camera or display needed
+
+Usage (from the repository root):
+    python benchmarks/suite.py --output baseline.json
+    python benchmarks/suite.py --compare baseline.json [--tolerance 0.15]
+
+With --compare the exit status is 1 if any gated metric got worse than the
+baseline by more than the tolerance.
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import cv2
+import dlib
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ModelRegistry
+from EAR import eye_aspect_ratios
+from MAR import mouth_aspect_ratios
+from HeadPose import getHeadTiltAndCoords
+from FrameAnalyzer import FrameAnalyzer
+from Profiler import Profiler
+from Overlay import draw_overlay
+from VideoEncoder import BACKENDS
+from ParallelExport import export_video
+from make_fixtures import ensure_fixtures, FIXTURES_DIR, RESOLUTIONS, FACE_COUNTS
+
+CASES = ('ear_mar', 'head_pose', 'analysis', 'export')
+
+# Stages whose median is gated in comparisons, the tails are informational
+GATED_STAGES = ('detect', 'landmarks', 'pose', 'overlay', 'encode')
+
+
+class Results:
+    """Named metrics with their unit and direction"""
+    def __init__(self):
+        self.metrics = {}
+
+    def add(self, name, value, unit, better='lower', gate=True):
+        self.metrics[name] = {'value': round(float(value), 4), 'unit': unit,
+                              'better': better, 'gate': gate}
+        print(f"  {name:<48} {value:>10.3f} {unit}")
+
+
+def per_call_us(function, repeats):
+    """Mean microseconds per call of function() over repeats calls"""
+    function()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function()
+    return (time.perf_counter() - start) / repeats * 1e6
+
+
+def reference_landmarks(path):
+    """Landmarks of the first face found in the video at path"""
+    analyzer = FrameAnalyzer()
+    vs = cv2.VideoCapture(path)
+    try:
+        while True:
+            ret, frame = vs.read()
+            if not ret:
+                raise RuntimeError(f"No face found in {path}")
+            result = analyzer.analyze(frame)
+            if result.faces:
+                return result.faces[0].shape, result.frame.shape[:2]
+    finally:
+        vs.release()
+
+
+def bench_ear_mar(results, shape, repeats):
+    landmarks = shape[None].astype(np.float64)
+    batch = np.repeat(landmarks, 64, axis=0)
+    results.add('ear_mar/single_us',
+                per_call_us(lambda: (eye_aspect_ratios(landmarks), mouth_aspect_ratios(landmarks)),
+                            repeats), 'us')
+    results.add('ear_mar/batch64_us_per_face',
+                per_call_us(lambda: (eye_aspect_ratios(batch), mouth_aspect_ratios(batch)),
+                            repeats // 10) / 64, 'us')
+
+
+def bench_head_pose(results, shape, size, repeats):
+    image_points = shape[[33, 8, 36, 45, 48, 54]].astype(np.float64)
+    results.add('head_pose/getHeadTiltAndCoords_us',
+                per_call_us(lambda: getHeadTiltAndCoords(size, image_points, size[0]), repeats),
+                'us')
+
+
+def read_frames(path, count):
+    vs = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < count:
+        ret, frame = vs.read()
+        if not ret:
+            break
+        frames.append(frame)
+    vs.release()
+    return frames
+
+
+def bench_analysis(results, name, frames):
+    """Analysis loop on decoded frames, with per-stage timings"""
+    profiler = Profiler()
+    analyzer = FrameAnalyzer(profiler=profiler)
+    start = time.perf_counter()
+    for frame in frames:
+        draw_overlay(analyzer.analyze(frame), profiler=profiler)
+    elapsed = time.perf_counter() - start
+    results.add(f'analysis/{name}/fps', len(frames) / elapsed, 'fps', better='higher')
+    add_stages(results, f'analysis/{name}', profiler)
+    results.add(f'analysis/{name}/alloc_kb_per_frame', allocated_per_frame(frames) / 1024, 'KB')
+
+
+def allocated_per_frame(frames, count=30):
+    """Median bytes allocated by analyze() per frame, as traced by tracemalloc
+
+    Counts what numpy and OpenCV allocate on top of the memory in use when
+    the call starts (the peak of the call), not dlib's internal buffers.
+    Measured apart from the timings, tracing slows every allocation down.
+    """
+    analyzer = FrameAnalyzer()
+    analyzer.analyze(frames[0])
+    allocated = []
+    tracemalloc.start()
+    for frame in frames[1:count + 1]:
+        tracemalloc.reset_peak()
+        (before, _) = tracemalloc.get_traced_memory()
+        result = analyzer.analyze(frame)
+        allocated.append(tracemalloc.get_traced_memory()[1] - before)
+        del result
+    tracemalloc.stop()
+    return float(np.median(allocated))
+
+
+def bench_export(results, name, path, encoder):
+    """ParallelExport.export_video of the whole video in this process (workers=1)
+
+    The landmark cache is left out so every run analyzes the frames.
+    """
+    profiler = Profiler()
+    with tempfile.TemporaryDirectory() as tmp:
+        stats = export_video(path, os.path.join(tmp, 'export.mp4'), workers=1, encoder=encoder,
+                             use_cache=False, profiler=profiler)
+    results.add(f'export/{name}/fps', stats['fps'], 'fps', better='higher')
+    results.add(f'export/{name}/encode_fps', stats['encode_fps'], 'fps', better='higher', gate=False)
+    add_stages(results, f'export/{name}', profiler, stages=('decode', 'encode'))
+
+
+def add_stages(results, prefix, profiler, stages=None):
+    for stage, s in profiler.summary().items():
+        if stages is not None and stage not in stages:
+            continue
+        results.add(f'{prefix}/{stage}_p50_ms', s['p50_ms'], 'ms', gate=stage in GATED_STAGES)
+        results.add(f'{prefix}/{stage}_p95_ms', s['p95_ms'], 'ms', gate=False)
+
+
+def environment():
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpus': os.cpu_count(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'dlib': dlib.__version__,
+    }
+
+
+def compare(current, baseline, tolerance):
+    """Print the change of every metric, returns the names of the regressions"""
+    regressions = []
+    print(f"\n{'metric':<48} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, metric in current.items():
+        if name not in baseline:
+            continue
+        old = baseline[name]['value']
+        new = metric['value']
+        change = (new - old) / old if old else 0.0
+        worse = change > tolerance if metric['better'] == 'lower' else change < -tolerance
+        flag = ''
+        if worse and metric['gate']:
+            flag = 'REGRESSION'
+            regressions.append(name)
+        elif worse:
+            flag = '(worse, not gated)'
+        print(f"{name:<48} {old:>10.3f} {new:>10.3f} {change * 100:>+7.1f}% {flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--output', default='benchmark_results.json', help='results JSON file')
+    parser.add_argument('--compare', metavar='BASELINE', help='baseline results JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help='allowed relative slowdown before a metric is a regression')
+    parser.add_argument('--cases', default=','.join(CASES),
+                        help=f"comma-separated subset of {', '.join(CASES)}")
+    parser.add_argument('--frames', type=int, default=120,
+                        help='frames per video in the analysis case, export runs whole videos')
+    parser.add_argument('--repeats', type=int, default=20000, help='calls per function benchmark')
+    parser.add_argument('--encoder', default='opencv', choices=BACKENDS,
+                        help='video encoder backend of the export case')
+    args = parser.parse_args()
+
+    cases = args.cases.split(',')
+    unknown = set(cases) - set(CASES)
+    if unknown:
+        sys.exit(f"Unknown cases: {', '.join(sorted(unknown))}")
+
+    # Load the models and generate the videos before timing anything
+    ModelRegistry.get_predictor()
+    ModelRegistry.get_detector()
+    fixtures = ensure_fixtures()
+    (shape, size) = reference_landmarks(fixtures[(RESOLUTIONS[0], 1)])
+
+    results = Results()
+    if 'ear_mar' in cases:
+        bench_ear_mar(results, shape, args.repeats)
+    if 'head_pose' in cases:
+        bench_head_pose(results, shape, size, args.repeats // 10)
+    videos = [(f"{resolution[0]}x{resolution[1]}_{faces}face", fixtures[(resolution, faces)])
+              for resolution in RESOLUTIONS for faces in FACE_COUNTS]
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, 'recorded', '*'))):
+        videos.append(('recorded_' + os.path.splitext(os.path.basename(path))[0], path))
+    for name, path in videos:
+        if 'analysis' in cases:
+            bench_analysis(results, name, read_frames(path, args.frames))
+        if 'export' in cases:
+            bench_export(results, name, path, args.encoder)
+
+    data = {'environment': environment(), 'results': results.metrics}
+    with open(args.output, 'w') as f:
+        json.dump(data, f, indent=2)
+    print(f"[INFO] Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results.metrics, baseline['results'], args.tolerance)
+        if regressions:
+            print(f"[ERROR] {len(regressions)} regressions over {args.tolerance * 100:.0f}%")
+            sys.exit(1)
+        print("[INFO] No regressions")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""
+Interrupted and resumed segmented export
+Stops a serial export after its first segment, as a crash would, runs it
+again and checks that the finished segment is reused, the landmark cache
+the first run started is completed, and the result matches an export
+that was never interrupted
+
+Usage (from the repository root, with the dlib models in place):
+    python -m pytest tests/
+"""
+import os
+import sys
+import cv2
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+import ParallelExport
+from FrameAnalyzer import FrameAnalyzer
+from LandmarkCache import LandmarkCache
+from ModelRegistry import PREDICTOR_PATH
+from make_fixtures import make_video
+
+PREDICTOR_DIR = os.path.abspath(os.path.dirname(PREDICTOR_PATH))
+
+# Two segments of 162 and 158 frames with workers=1
+FRAMES = 320
+OPTIONS = {'frame_size': (320, 240), 'detect_interval': 3}
+
+
+def read_frames(path):
+    vs = cv2.VideoCapture(path)
+    frames = []
+    while True:
+        ret, frame = vs.read()
+        if not ret:
+            break
+        frames.append(frame)
+    vs.release()
+    return frames
+
+
+@pytest.mark.skipif(not os.path.isdir(PREDICTOR_DIR), reason="dlib shape predictor not found")
+def test_interrupted_export_resumes(tmp_path, monkeypatch):
+    # The landmark cache lives in the working directory, start without one
+    monkeypatch.chdir(tmp_path)
+    os.symlink(PREDICTOR_DIR, os.path.dirname(PREDICTOR_PATH))
+    make_video('video.mp4', (320, 240), 1, FRAMES)
+
+    reference = ParallelExport.export_video('video.mp4', 'reference.avi', analyzer_options=OPTIONS,
+                                            workers=1, encoder='opencv', use_cache=False)
+    assert reference['chunks'] == 2
+
+    export_chunk = ParallelExport._export_chunk
+
+    def crash_after_first_segment(video_path, chunk_path, start, *args, **kwargs):
+        if start > 0:
+            raise KeyboardInterrupt
+        return export_chunk(video_path, chunk_path, start, *args, **kwargs)
+
+    monkeypatch.setattr(ParallelExport, '_export_chunk', crash_after_first_segment)
+    with pytest.raises(KeyboardInterrupt):
+        ParallelExport.export_video('video.mp4', 'output.avi', analyzer_options=OPTIONS,
+                                    workers=1, encoder='opencv')
+    assert os.path.exists(os.path.join('output.avi.parts', ParallelExport.MANIFEST_NAME))
+
+    monkeypatch.setattr(ParallelExport, '_export_chunk', export_chunk)
+    stats = ParallelExport.export_video('video.mp4', 'output.avi', analyzer_options=OPTIONS,
+                                        workers=1, encoder='opencv')
+    assert stats['resumed'] == 1
+    assert stats['frames'] == FRAMES
+    assert not os.path.exists('output.avi.parts')
+
+    cache = LandmarkCache('video.mp4', FrameAnalyzer(**OPTIONS).cache_settings())
+    assert cache.complete and cache.frames == FRAMES
+
+    output = read_frames('output.avi')
+    expected = read_frames('reference.avi')
+    assert len(output) == len(expected) == FRAMES
+    assert all(np.array_equal(a, b) for a, b in zip(output, expected))